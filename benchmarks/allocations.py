@@ -0,0 +1,139 @@
+"""
+Counts what a frame allocates while every player holds a weapon and
+fires every tick, with their blobs picking weapons up and running into
+viruses.
+
+Two passes over the same frames:
+  - KiB allocated per phase, from tracemalloc like hot_paths --csv
+  - objects made per frame, by class, counted from __init__ calls so
+    pygame's own types (Vector2, Color) only show up through the
+    classes that hold them
+
+Run from the repository root:
+
+    python -m benchmarks.allocations
+    python -m benchmarks.allocations --no-pool
+    python -m benchmarks.allocations --players 4 --blobs 6 --fire-rate 30
+
+--no-pool makes a new Bullet for every shot instead of reusing ones from
+weapon.bullet_pool, to compare against
+"""
+
+import argparse
+import math
+import sys
+import tracemalloc
+from collections import Counter
+
+from pygame import Vector2
+
+from benchmarks.common import (
+    Scenario,
+    build_simulation,
+    init_pygame,
+    respawn_dead,
+    view_surfaces,
+    wandering_inputs,
+)
+from player import PlayerInput
+from profiler import Profiler
+from simulation import Simulation
+from viewports import render_view
+from weapon import bullet_pool
+
+
+# everyone moves like wandering_inputs, fires at where they'll be in a
+# quarter turn and tries to pick up whatever they run over
+def firing_inputs(sim: Simulation) -> list[PlayerInput]:
+    inputs = []
+    for i, wander in enumerate(wandering_inputs(sim)):
+        angle = sim.tick / sim.tick_rate + i * math.pi + math.pi / 2
+        inputs.append(PlayerInput(wander.move, pickup=True, fire=True, aim=Vector2(math.cos(angle), math.sin(angle))))
+    return inputs
+
+
+# gives players without a weapon the next one along, with ammo to spare
+def arm(sim: Simulation, fire_rate: float):
+    weapons = sim.weapons.as_list()
+    for i, player in enumerate(sim.players):
+        if player.weapon is None:
+            player.weapon = weapons[i % len(weapons)].copy()
+            player.weapon.fire_rate = fire_rate
+            player.weapon.ammo = 10**9
+
+
+def run(scenario: Scenario, frames: int, warmup: int, fire_rate: float, track_memory: bool, count: bool):
+    sim = build_simulation(scenario)
+    surfaces = view_surfaces(len(sim.players))
+    profiler = Profiler(history=frames)
+    profiler.track_memory = track_memory
+    sim.profiler = profiler
+    made: Counter[str] = Counter()
+
+    def on_call(frame, event, _):
+        if event == "call" and frame.f_code.co_name == "__init__":
+            made[type(frame.f_locals["self"]).__name__] += 1
+
+    for frame in range(warmup + frames):
+        if frame == warmup:
+            profiler.reset()
+            if count:
+                sys.setprofile(on_call)
+
+        arm(sim, fire_rate)
+        sim.step(firing_inputs(sim))
+        respawn_dead(sim)
+        for surface, player in zip(surfaces, sim.players):
+            surface.fill("white")
+            render_view(sim, surface, player, 1.0, profiler)
+        profiler.end_frame()
+
+    sys.setprofile(None)
+    return profiler, made
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=9, help="chunks per axis")
+    parser.add_argument("--food", type=int, default=100, help="food per chunk")
+    # enemies that eat a blob grow until they eat everyone, and players that
+    # respawn every frame never get a steady stream of bullets going
+    parser.add_argument("--enemies", type=int, default=0)
+    parser.add_argument("--viruses", type=int, default=200)
+    parser.add_argument("--blobs", type=int, default=4, help="blobs per player")
+    parser.add_argument("--players", type=int, default=2)
+    parser.add_argument("--fire-rate", type=float, default=60, help="bullets per second per player")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument(
+        "--warmup", type=int, default=600, help="frames to fill the world with bullets first, they last ~5s"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-pool", action="store_true", help="don't reuse bullets")
+    args = parser.parse_args()
+    bullet_pool.enabled = not args.no_pool
+
+    init_pygame()
+    scenario = Scenario(args.chunks, args.food, args.enemies, args.viruses, args.blobs, args.players, args.seed)
+
+    tracemalloc.start()
+    memory, _ = run(scenario, args.frames, args.warmup, args.fire_rate, track_memory=True, count=False)
+    tracemalloc.stop()
+    _, made = run(scenario, args.frames, args.warmup, args.fire_rate, track_memory=False, count=True)
+
+    print(scenario, "" if bullet_pool.enabled else "(bullets not pooled)")
+    print(f"{'phase':<18}{'KiB/frame':>12}")
+    total = 0.0
+    for name in memory.phases():
+        kib = memory.average_bytes(name) / 1024
+        total += kib
+        print(f"{name:<18}{kib:>12.1f}")
+    print(f"{'total':<18}{total:>12.1f}")
+    print()
+    print(f"{'objects made':<18}{'per frame':>12}")
+    for name, n in made.most_common():
+        print(f"{name:<18}{n / args.frames:>12.1f}")
+    print(f"{'total':<18}{sum(made.values()) / args.frames:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
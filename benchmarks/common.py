@@ -0,0 +1,116 @@
+import functools
+import math
+import os
+
+# the benchmarks draw to offscreen surfaces but textures still need a
+# display mode set before they can be converted
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+from pygame import Vector2
+
+from food import FoodStore
+from player import Blob, Player, PlayerInput
+from sharding import ShardedSimulation
+from simulation import Simulation
+
+VIEW_WIDTH = 640
+VIEW_HEIGHT = 720
+
+
+# everything that decides how big a benchmark world is
+class Scenario:
+    def __init__(
+        self,
+        chunks_per_axis: int = 9,
+        food_per_chunk: int = 100,
+        enemies: int = 50,
+        viruses: int = 20,
+        blobs: int = 1,
+        players: int = 2,
+        seed: int = 0,
+    ) -> None:
+        self.chunks_per_axis = chunks_per_axis
+        self.food_per_chunk = food_per_chunk
+        self.enemies = enemies
+        self.viruses = viruses
+        self.blobs = blobs
+        self.players = players
+        self.seed = seed
+
+    def __str__(self) -> str:
+        return (
+            f"{self.chunks_per_axis}x{self.chunks_per_axis} chunks, "
+            f"{self.food_per_chunk} food/chunk, {self.enemies} enemies, "
+            f"{self.viruses} viruses, {self.players} players x {self.blobs} blobs"
+        )
+
+
+def init_pygame():
+    pygame.init()
+    pygame.display.set_mode((1, 1))
+
+
+# shards > 1 splits the world between that many processes, see sharding.py
+# food_threads > 0 resolves food on that many threads, see World
+def build_simulation(scenario: Scenario, shards: int = 1, food_threads: int = 0, lod: bool = True) -> Simulation:
+    kind = functools.partial(ShardedSimulation, shards=shards) if shards > 1 else Simulation
+    sim = kind(
+        scenario.players,
+        seed=scenario.seed,
+        n_enemies=scenario.enemies,
+        n_viruses=scenario.viruses,
+        chunks_per_axis=scenario.chunks_per_axis,
+        food_threads=food_threads,
+        lod=lod,
+    )
+
+    for chunk in sim.world.chunks:
+        chunk.food = FoodStore(scenario.food_per_chunk, sim.rng)
+        chunk.spawn_food(scenario.food_per_chunk)
+
+    for player in sim.players:
+        split_player(player, scenario.blobs)
+
+    return sim
+
+
+# replaces the player's blobs with n blobs in a ring around it
+def split_player(player: Player, n: int):
+    if n <= 1:
+        return
+
+    size = Player.STARTING_SIZE
+    ring = size * n / math.pi
+    player.blobs = []
+    for i in range(n):
+        angle = 2 * math.pi * i / n
+        offset = Vector2(math.cos(angle), math.sin(angle)) * ring
+        player.blobs.append(Blob(player.position + offset, size, player.color, player.camera))
+
+
+# players steer in slow circles so they keep reaching new food
+def wandering_inputs(sim: Simulation) -> list[PlayerInput]:
+    inputs = []
+    for i in range(len(sim.players)):
+        angle = sim.tick / sim.tick_rate + i * math.pi
+        inputs.append(PlayerInput(Vector2(math.cos(angle), math.sin(angle))))
+    return inputs
+
+
+# puts players who died back somewhere random, in the same place in
+# sim.players like the server does, and returns the (old, new) pairs
+def respawn_dead(sim: Simulation) -> list[tuple[Player, Player]]:
+    respawned = []
+    for i, player in enumerate(sim.players):
+        if not player.blobs:
+            sim.remove_player(player)
+            new = sim.add_player()
+            sim.players.insert(i, sim.players.pop())
+            respawned.append((player, new))
+    return respawned
+
+
+def view_surfaces(players: int) -> list[pygame.Surface]:
+    return [pygame.Surface((VIEW_WIDTH, VIEW_HEIGHT)) for _ in range(players)]
@@ -0,0 +1,129 @@
+"""
+Times the per-frame hot paths of the simulation and the renderer.
+
+Run from the repository root:
+
+    python -m benchmarks.hot_paths
+    python -m benchmarks.hot_paths --chunks 50 --enemies 500 --blobs 6
+    python -m benchmarks.hot_paths --sweep 9,18,36,54 --csv scaling.csv
+    python -m benchmarks.hot_paths --players 8 --food-threads 4
+    python -m benchmarks.hot_paths --enemies 5000
+    python -m benchmarks.hot_paths --chunks 36 --enemies 20000 --no-lod
+"""
+
+import argparse
+import csv
+import tracemalloc
+
+from benchmarks.common import (
+    Scenario,
+    build_simulation,
+    init_pygame,
+    respawn_dead,
+    view_surfaces,
+    wandering_inputs,
+)
+from viewports import render_view
+from profiler import Profiler
+
+
+# steps the scenario for `frames` frames, rendering every player's view
+# each frame, and returns the profiler holding the phase timings
+def run(
+    scenario: Scenario, frames: int, warmup: int, track_memory: bool, food_threads: int = 0, lod: bool = True
+) -> Profiler:
+    sim = build_simulation(scenario, food_threads=food_threads, lod=lod)
+    surfaces = view_surfaces(len(sim.players))
+    profiler = Profiler(history=frames)
+    profiler.track_memory = track_memory
+    sim.profiler = profiler
+
+    for frame in range(warmup + frames):
+        if frame == warmup:
+            profiler.reset()
+
+        sim.step(wandering_inputs(sim))
+        # crowded worlds would otherwise be rebuilt every few frames
+        respawn_dead(sim)
+
+        for surface, player in zip(surfaces, sim.players):
+            surface.fill("white")
+            render_view(sim, surface, player, 1.0, profiler)
+
+        profiler.end_frame()
+
+    return profiler
+
+
+def report(scenario: Scenario, timing: Profiler, memory: Profiler):
+    print(scenario)
+    print(f"{'phase':<18}{'avg ms':>10}{'p99 ms':>10}{'KiB/frame':>12}")
+    total = 0.0
+    for name in timing.phases():
+        avg = timing.average_ms(name)
+        total += avg
+        print(
+            f"{name:<18}{avg:>10.3f}{timing.percentile_ms(name, 99):>10.3f}"
+            f"{memory.average_bytes(name) / 1024:>12.1f}"
+        )
+    print(f"{'total':<18}{total:>10.3f}")
+    for name in timing.counters():
+        print(f"{name:<18}{timing.average_count(name):>10.1f}")
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=9, help="chunks per axis")
+    parser.add_argument("--food", type=int, default=100, help="food per chunk")
+    parser.add_argument("--enemies", type=int, default=50)
+    parser.add_argument("--viruses", type=int, default=20)
+    parser.add_argument("--blobs", type=int, default=1, help="blobs per player")
+    parser.add_argument("--players", type=int, default=2)
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--warmup", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--food-threads", type=int, default=0, help="resolve food on this many threads")
+    parser.add_argument("--no-lod", action="store_true", help="simulate everything every tick")
+    parser.add_argument(
+        "--sweep", type=str, default=None, help="comma separated chunks per axis to run one after another"
+    )
+    parser.add_argument("--csv", type=str, default=None, help="write avg ms per phase to this file")
+    args = parser.parse_args()
+
+    init_pygame()
+
+    sizes = [int(s) for s in args.sweep.split(",")] if args.sweep else [args.chunks]
+    rows = []
+    for chunks in sizes:
+        scenario = Scenario(
+            chunks, args.food, args.enemies, args.viruses, args.blobs, args.players, args.seed
+        )
+        timing = run(scenario, args.frames, args.warmup, False, args.food_threads, not args.no_lod)
+
+        # tracemalloc slows everything down so memory gets its own run
+        tracemalloc.start()
+        memory = run(scenario, args.frames, args.warmup, True, args.food_threads, not args.no_lod)
+        tracemalloc.stop()
+
+        report(scenario, timing, memory)
+        for name in timing.phases():
+            rows.append(
+                [
+                    chunks,
+                    name,
+                    round(timing.average_ms(name), 4),
+                    round(timing.percentile_ms(name, 99), 4),
+                    round(memory.average_bytes(name)),
+                ]
+            )
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["chunks_per_axis", "phase", "avg_ms", "p99_ms", "bytes_per_frame"])
+            writer.writerows(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Compares ticks per second with the world simulated in one process and
+split between worker processes, see sharding.py.
+
+Shards only pay off with more cores than shards and a world busy enough
+to cover sending it all between processes every tick.
+
+Run from the repository root:
+
+    python -m benchmarks.sharding
+    python -m benchmarks.sharding --chunks 36 --enemies 2000 --players 8 --shards 1,2,4,8
+"""
+
+import argparse
+import os
+import time
+
+from benchmarks.common import Scenario, build_simulation, respawn_dead, wandering_inputs
+from profiler import Profiler
+from sharding import ShardedSimulation
+
+
+# returns ticks per second and the average ms spent in each phase
+def run(scenario: Scenario, shards: int, ticks: int, warmup: int) -> tuple[float, dict[str, float]]:
+    sim = build_simulation(scenario, shards)
+    sim.profiler = Profiler(history=ticks)
+    try:
+        for tick in range(warmup + ticks):
+            if tick == warmup:
+                sim.profiler.reset()
+                start = time.perf_counter()
+            sim.step(wandering_inputs(sim))
+            respawn_dead(sim)
+            sim.profiler.end_frame()
+        elapsed = time.perf_counter() - start
+    finally:
+        if isinstance(sim, ShardedSimulation):
+            sim.close()
+    phases = {name: sim.profiler.average_ms(name) for name in sim.profiler.phases()}
+    return ticks / elapsed, phases
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=18, help="chunks per axis")
+    parser.add_argument("--food", type=int, default=100, help="food per chunk")
+    parser.add_argument("--enemies", type=int, default=500)
+    parser.add_argument("--viruses", type=int, default=20)
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--shards", type=str, default="1,2,4", help="comma separated shard counts to compare")
+    parser.add_argument("--ticks", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    scenario = Scenario(args.chunks, args.food, args.enemies, args.viruses, 1, args.players, args.seed)
+    print(f"{scenario}, {os.cpu_count()} cpus")
+    for shards in [int(s) for s in args.shards.split(",")]:
+        rate, phases = run(scenario, shards, args.ticks, args.warmup)
+        breakdown = ", ".join(f"{name} {ms:.2f}" for name, ms in phases.items())
+        print(f"{shards:>3} shards {rate:>8.0f} ticks/s  ms: {breakdown}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Measures how many bytes a tick of snapshots costs each client.
+
+Every player gets a full snapshot (against nothing) and a delta snapshot
+(against the last one they acknowledged, `--lag` ticks ago) each tick and
+the decoded delta is checked against what the server saw.
+
+Run from the repository root:
+
+    python -m benchmarks.snapshots
+    python -m benchmarks.snapshots --players 8 --enemies 500 --lag 6
+"""
+
+import argparse
+
+from benchmarks.common import Scenario, build_simulation, respawn_dead, wandering_inputs
+from snapshot import EntityIds, SnapshotDecoder, SnapshotEncoder
+
+
+def run(scenario: Scenario, ticks: int, lag: int) -> tuple[float, float]:
+    sim = build_simulation(scenario)
+    ids = EntityIds()
+    player_ids = {player: i + 1 for i, player in enumerate(sim.players)}
+    full = [SnapshotEncoder(ids) for _ in sim.players]
+    delta = [SnapshotEncoder(ids) for _ in sim.players]
+    decoders = [SnapshotDecoder() for _ in sim.players]
+    full_bytes = 0
+    delta_bytes = 0
+
+    for _ in range(ticks):
+        sim.step(wandering_inputs(sim))
+        for old, new in respawn_dead(sim):
+            player_ids[new] = player_ids.pop(old)
+        for i, player in enumerate(sim.players):
+            full_bytes += len(full[i].encode(sim, player, player_ids, 0))
+
+            data = delta[i].encode(sim, player, player_ids, 0)
+            delta_bytes += len(data)
+            snapshot = decoders[i].decode(data)
+            sent = delta[i]._sent[sim.tick]
+            assert snapshot.entities == sent.entities, "decoded entities differ"
+            assert snapshot.food == sent.food, "decoded food differs"
+            # the ack arrives with an input `lag` ticks later
+            delta[i].ack(sim.tick - lag)
+
+    n = max(sim.tick * len(sim.players), 1)
+    return full_bytes / n, delta_bytes / n
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=9, help="chunks per axis")
+    parser.add_argument("--food", type=int, default=100, help="food per chunk")
+    parser.add_argument("--enemies", type=int, default=50)
+    parser.add_argument("--viruses", type=int, default=20)
+    parser.add_argument("--blobs", type=int, default=1, help="blobs per player")
+    parser.add_argument("--players", type=int, default=2)
+    parser.add_argument("--ticks", type=int, default=600)
+    parser.add_argument("--lag", type=int, default=3, help="ticks before an ack reaches the server")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    scenario = Scenario(args.chunks, args.food, args.enemies, args.viruses, args.blobs, args.players, args.seed)
+    full, delta = run(scenario, args.ticks, args.lag)
+    print(scenario)
+    print(f"{'full':<10}{full:>10.0f} bytes/tick per client")
+    print(f"{'delta':<10}{delta:>10.0f} bytes/tick per client ({delta / full:.1%} of full)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,8 @@
-from pygame import Vector2, Surface
+import math
+
+from pygame import Rect, Vector2, Surface
+
+from sprites import SpriteCache
 
 
 class Camera:
@@ -11,6 +15,8 @@ class Camera:
         # Camera does not mutate this
         self.target = target
         self.zoom = zoom
+        # shapes drawn by this camera, see sprites.py
+        self.sprites = SpriteCache()
 
     # only use this when rendering
     # not for stuff like physics or pathfinding
@@ -22,3 +28,13 @@ class Camera:
         top_left_relative.x += half_w
         top_left_relative.y += half_h
         return top_left_relative
+
+    # the part of the world that's on screen, in world coordinates
+    def view_rect(self, screen: Surface) -> Rect:
+        half_w = screen.get_width() // 2 / self.zoom
+        half_h = screen.get_height() // 2 / self.zoom
+        left = math.floor(self.target.x - half_w)
+        top = math.floor(self.target.y - half_h)
+        right = math.ceil(self.target.x + half_w)
+        bottom = math.ceil(self.target.y + half_h)
+        return Rect(left, top, right - left, bottom - top)
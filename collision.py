@@ -0,0 +1,68 @@
+import numpy as np
+
+# circle tests on squared distances so nothing needs a sqrt to find out
+# whether two circles meet, every circle check in the game goes through
+# these on plain numbers or arrays rather than building circle objects
+#   touching: the circles meet or overlap, distance <= sum of radii
+#   strict: they overlap, distance < sum of radii
+# the batch versions take arrays of x, y and radius and return indices
+
+
+def circles_touch(ax: float, ay: float, ar: float, bx: float, by: float, br: float) -> bool:
+    dx = ax - bx
+    dy = ay - by
+    r = ar + br
+    return dx * dx + dy * dy <= r * r
+
+
+# whether each of the `a` circles meets each of the `b` circles, rows are
+# `a` and columns are `b`
+def touch_matrix(
+    ax: np.ndarray,
+    ay: np.ndarray,
+    ar: np.ndarray,
+    bx: np.ndarray,
+    by: np.ndarray,
+    br: np.ndarray,
+    strict: bool = False,
+) -> np.ndarray:
+    dx = bx[None, :] - ax[:, None]
+    dy = by[None, :] - ay[:, None]
+    r = br[None, :] + ar[:, None]
+    dist_sq = dx * dx + dy * dy
+    return dist_sq < r * r if strict else dist_sq <= r * r
+
+
+# indices of the circles that one circle meets, in order
+def circle_vs_many(
+    x: float, y: float, r: float, xs: np.ndarray, ys: np.ndarray, rs: np.ndarray, strict: bool = False
+) -> np.ndarray:
+    dx = xs - x
+    dy = ys - y
+    reach = rs + r
+    dist_sq = dx * dx + dy * dy
+    return np.flatnonzero(dist_sq < reach * reach if strict else dist_sq <= reach * reach)
+
+
+# every (i, j) where `a` circle i meets `b` circle j, ordered by i then j
+# it's a dense test so keep it to sets small enough to compare everything
+# against everything, ex one player's blobs or what a broadphase found
+def many_vs_many(
+    ax: np.ndarray,
+    ay: np.ndarray,
+    ar: np.ndarray,
+    bx: np.ndarray,
+    by: np.ndarray,
+    br: np.ndarray,
+    strict: bool = False,
+) -> tuple[np.ndarray, np.ndarray]:
+    first, second = np.nonzero(touch_matrix(ax, ay, ar, bx, by, br, strict))
+    return first, second
+
+
+# x, y and radius arrays of anything with a position and size
+def circles_of(items) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    x = np.array([item.position.x for item in items], dtype=np.float64)
+    y = np.array([item.position.y for item in items], dtype=np.float64)
+    r = np.array([item.size for item in items], dtype=np.float64)
+    return x, y, r
@@ -1,61 +1,307 @@
-from pygame import Vector2, Color
-from collision_circle import CollisionCircle
-import pygame
-from food import Food
-from player import Blob
-from weapon import Effect
 from typing import Optional
 
+import numpy as np
+import pygame
+
 from camera import Camera
+from collision import circles_of, touch_matrix
+from food import colors
+from weapon import Effect
+
+# effect codes stored per enemy, 0 is no effect
+EFFECTS = list(Effect)
+NO_EFFECT = 0
+SLOW_DOWN = EFFECTS.index(Effect.SLOW_DOWN) + 1
+DAMAGE = EFFECTS.index(Effect.DAMAGE) + 1
+ANNIHILATION = EFFECTS.index(Effect.ANNIHILATION) + 1
 
 
-class Enemy:
+# every enemy in the world stored as parallel arrays
+# only the first `count` entries are alive, eaten enemies are removed by
+# compacting the arrays like FoodStore. indices move when that happens,
+# `ids` don't and are what to hold on to across ticks
+class EnemySwarm:
     ENEMY_DAMAGE = 10
+    VELOCITY = 40
+    INITIAL_CAPACITY = 64
+    FIELDS = {
+        "ids": np.int64,
+        "x": np.float64,
+        "y": np.float64,
+        "prev_x": np.float64,
+        "prev_y": np.float64,
+        "size": np.float64,
+        "velocity": np.float64,
+        # index into food.colors
+        "color": np.int16,
+        "effect": np.int8,
+        # seconds left of the effect
+        "effect_time": np.float64,
+        # see LodScheduler, last_step is -1 until the first step
+        "tier": np.int8,
+        "last_step": np.int64,
+    }
+
+    def __init__(self) -> None:
+        # one array per FIELDS entry, made and grown by _allocate
+        self.ids: np.ndarray
+        self.x: np.ndarray
+        self.y: np.ndarray
+        self.prev_x: np.ndarray
+        self.prev_y: np.ndarray
+        self.size: np.ndarray
+        self.velocity: np.ndarray
+        self.color: np.ndarray
+        self.effect: np.ndarray
+        self.effect_time: np.ndarray
+        self.tier: np.ndarray
+        self.last_step: np.ndarray
+        self.count = 0
+        # new enemies get next_id, then it goes up by id_step, see _Shard
+        self.next_id = 0
+        self.id_step = 1
+        self._allocate(self.INITIAL_CAPACITY)
+
+    def _allocate(self, capacity: int):
+        n = self.count
+        old = getattr(self, "ids", None)
+        for name, dtype in self.FIELDS.items():
+            array = np.zeros(capacity, dtype=dtype)
+            if old is not None:
+                array[:n] = getattr(self, name)[:n]
+            setattr(self, name, array)
+
+    def __len__(self) -> int:
+        return self.count
+
+    # appends enemies, returns the indices they went in at
+    def spawn(
+        self,
+        x: np.ndarray,
+        y: np.ndarray,
+        size: np.ndarray,
+        color: np.ndarray,
+        velocity: Optional[np.ndarray] = None,
+        ids: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        k = len(x)
+        n = self.count
+        if n + k > len(self.x):
+            self._allocate(max(2 * len(self.x), n + k))
+        end = n + k
+        if ids is None:
+            ids = self.next_id + self.id_step * np.arange(k)
+            self.next_id += self.id_step * k
+        self.ids[n:end] = ids
+        self.x[n:end] = x
+        self.y[n:end] = y
+        self.prev_x[n:end] = x
+        self.prev_y[n:end] = y
+        self.size[n:end] = size
+        self.velocity[n:end] = self.VELOCITY if velocity is None else velocity
+        self.color[n:end] = color
+        self.effect[n:end] = NO_EFFECT
+        self.effect_time[n:end] = 0
+        self.tier[n:end] = 0
+        self.last_step[n:end] = -1
+        self.count = end
+        return np.arange(n, end)
+
+    # removes the enemies at `indices`, keeping the rest in order
+    def remove(self, indices):
+        n = self.count
+        keep = np.ones(n, dtype=bool)
+        keep[indices] = False
+        k = int(keep.sum())
+        if k == n:
+            return
+        for name in self.FIELDS:
+            array = getattr(self, name)
+            array[:k] = array[:n][keep]
+        self.count = k
+
+    # replaces every enemy with these, ex with what shards sent back
+    # enemies that were here before keep their previous position
+    def assign(self, ids: np.ndarray, x: np.ndarray, y: np.ndarray, size: np.ndarray, color: np.ndarray):
+        n = self.count
+        prev_x = np.array(x, dtype=np.float64)
+        prev_y = np.array(y, dtype=np.float64)
+        if n > 0:
+            order = np.argsort(self.ids[:n])
+            at = order[np.searchsorted(self.ids[:n], ids, sorter=order).clip(max=n - 1)]
+            known = self.ids[at] == ids
+            prev_x[known] = self.prev_x[at[known]]
+            prev_y[known] = self.prev_y[at[known]]
+
+        self.count = 0
+        self.spawn(x, y, size, color, ids=ids)
+        k = len(ids)
+        self.prev_x[:k] = prev_x
+        self.prev_y[:k] = prev_y
+
+    def store_previous(self):
+        n = self.count
+        self.prev_x[:n] = self.x[:n]
+        self.prev_y[:n] = self.y[:n]
+
+    def set_effect(self, i: int, effect: Effect):
+        self.effect[i] = EFFECTS.index(effect) + 1
+        self.effect_time[i] = effect.duration()
+
+    # every field of the enemies at `indices` as plain tuples, for handing
+    # enemies to another process, see add_rows
+    def rows(self, indices) -> list[tuple]:
+        return list(
+            zip(
+                self.ids[indices].tolist(),
+                self.x[indices].tolist(),
+                self.y[indices].tolist(),
+                self.size[indices].tolist(),
+                self.velocity[indices].tolist(),
+                self.color[indices].tolist(),
+                self.effect[indices].tolist(),
+                self.effect_time[indices].tolist(),
+                self.tier[indices].tolist(),
+                self.last_step[indices].tolist(),
+            )
+        )
+
+    def add_rows(self, rows: list[tuple]):
+        if not rows:
+            return
+        ids, x, y, size, velocity, color, effect, effect_time, tier, last_step = (np.array(c) for c in zip(*rows))
+        added = self.spawn(x, y, size, color, velocity, ids)
+        self.effect[added] = effect
+        self.effect_time[added] = effect_time
+        self.tier[added] = tier
+        self.last_step[added] = last_step
+
+    # units per second of the enemies at `indices`, also runs down their
+    # effects by `ticks` ticks each so it's called once per step, see step
+    def speed(self, dt: float, indices: np.ndarray, ticks: np.ndarray) -> np.ndarray:
+        size = self.size[indices]
+        effect = self.effect[indices]
+        effect_time = self.effect_time[indices]
+
+        expired = (effect != NO_EFFECT) & (effect_time <= 0)
+        effect[expired] = NO_EFFECT
+        effect_time[expired] = 0
+
+        speed = self.velocity[indices] * 50 / size
+        speed[effect == SLOW_DOWN] *= Effect.SLOW_DOWN.slowdown_factor()
+        damaged = effect == DAMAGE
+        annihilated = effect == ANNIHILATION
+        size[damaged] -= 5 * ticks[damaged]
+        size[annihilated] -= 30 * ticks[annihilated]
+        affected = effect != NO_EFFECT
+        effect_time[affected] -= dt * ticks[affected]
+        # damage runs out twice as fast as the rest
+        effect_time[damaged] -= dt * ticks[damaged]
+
+        self.size[indices] = size
+        self.effect[indices] = effect
+        self.effect_time[indices] = effect_time
+        return speed
+
+    # moves enemies relative to whichever target is closest to them,
+    # towards it if the enemy is at least as big as target_sizes says, away
+    # from it if not. only the enemies at `indices` move, each by `ticks`
+    # ticks worth, see LodScheduler. every enemy moves one tick by default
+    # returns the nearest target of each enemy moved and how far it is
+    def step(
+        self,
+        targets: np.ndarray,
+        target_sizes: np.ndarray,
+        dt: float,
+        world_size: float,
+        indices: Optional[np.ndarray] = None,
+        ticks: Optional[np.ndarray] = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        if indices is None:
+            indices = np.arange(self.count)
+        if ticks is None:
+            ticks = np.ones(len(indices), dtype=np.int64)
+        n = len(indices)
+        if n == 0 or len(targets) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+
+        speed = self.speed(dt, indices, ticks)
+        x = self.x[indices]
+        y = self.y[indices]
+
+        # rows are enemies, columns are targets
+        dx = targets[None, :, 0] - x[:, None]
+        dy = targets[None, :, 1] - y[:, None]
+        dist_sq = dx * dx + dy * dy
+        nearest = dist_sq.argmin(axis=1)
+        rows = np.arange(n)
+        dx = dx[rows, nearest]
+        dy = dy[rows, nearest]
+        dist = np.sqrt(dist_sq[rows, nearest])
+        # an enemy sitting right on its target has nowhere to go
+        step = np.divide(speed * dt * ticks, dist, out=np.zeros(n), where=dist > 0)
+        step[self.size[indices] < target_sizes[nearest]] *= -1
+        self.x[indices] = np.clip(x + dx * step, 0, world_size)
+        self.y[indices] = np.clip(y + dy * step, 0, world_size)
+        return nearest, dist
+
+    # removes the enemies whose effects shrank them to nothing
+    def remove_dead(self):
+        gone = np.flatnonzero(self.size[: self.count] <= 0)
+        if len(gone) > 0:
+            self.remove(gone)
+
+    # indices of the enemies overlapping a world space rect, out of
+    # `indices` if given or every enemy if not
+    def in_rect(self, rect: pygame.Rect, indices: Optional[np.ndarray] = None) -> np.ndarray:
+        if indices is None:
+            n = self.count
+            x, y, size = self.x[:n], self.y[:n], self.size[:n]
+        else:
+            x, y, size = self.x[indices], self.y[indices], self.size[indices]
+        inside = (
+            (x + size >= rect.left)
+            & (x - size <= rect.right)
+            & (y + size >= rect.top)
+            & (y - size <= rect.bottom)
+        )
+        return np.flatnonzero(inside) if indices is None else indices[inside]
+
+    # the enemies near any of `blobs` and which of those each blob touches,
+    # rows are blobs and columns are the near enemies
+    def touching(self, blobs: list) -> tuple[np.ndarray, np.ndarray]:
+        x, y, radius = circles_of(blobs)
+        left = int((x - radius).min()) - 1
+        top = int((y - radius).min()) - 1
+        area = pygame.Rect(left, top, int((x + radius).max()) + 2 - left, int((y + radius).max()) + 2 - top)
+        near = self.in_rect(area)
+
+        return near, touch_matrix(x, y, radius, self.x[near], self.y[near], self.size[near])
+
+    # grows the enemies at `indices` by the area of food they ate
+    def eat_food(self, indices: np.ndarray, area: np.ndarray):
+        self.size[indices] = np.sqrt(self.size[indices] ** 2 + area)
+
+    def eat_blob(self, i: int, blob_size: float):
+        self.size[i] = (self.size[i] ** 2 + blob_size**2) ** 0.6
+
+    # draws the enemies at `indices`, returns how many
+    def render(self, screen, camera: Camera, alpha: float, indices: np.ndarray) -> int:
+        n = len(indices)
+        if n == 0:
+            return 0
+        px = self.prev_x[indices]
+        py = self.prev_y[indices]
+        x = px + (self.x[indices] - px) * alpha
+        y = py + (self.y[indices] - py) * alpha
+
+        zoom = camera.zoom
+        sx = ((x - camera.target.x) * zoom + screen.get_width() // 2).tolist()
+        sy = ((y - camera.target.y) * zoom + screen.get_height() // 2).tolist()
+        radii = (self.size[indices] * zoom).tolist()
+        color = self.color[indices].tolist()
 
-    def __init__(
-        self, pos: Vector2, size: int, color: Color, velocity: float = 40
-    ) -> None:
-        self.position = pos
-        self.velocity = velocity
-        self.color = color
-        self.size = size
-        self._effect: Optional[Effect] = None
-        self._effect_duration = 0.0
-
-    def render(self, screen, camera: Camera):
-        screen_pos = camera.to_screen_pos(screen, self.position)
-        pygame.draw.circle(screen, self.color, screen_pos, self.size * camera.zoom)
-
-    def set_effect(self, effect: Effect):
-        self._effect = effect
-        self._effect_duration = effect.duration()
-
-    def update(self, player_pos: Vector2, dt: float):
-        dir = player_pos - self.position
-
-        vel = self.velocity * 50 / self.size 
-        if self._effect is not None:
-            if self._effect_duration <= 0:
-                self._effect = None
-                self._effect_duration = 0
-            else:
-                if self._effect == Effect.SLOW_DOWN:
-                    vel *= self._effect.slowdown_factor()
-                elif self._effect == Effect.DAMAGE:
-                    self.size -= 5
-                    self._effect_duration -= dt
-                elif self._effect == Effect.ANNIHILATION:
-                    self.size -= 30
-                self._effect_duration -= dt
-
-        v = dir.normalize() * vel * dt
-        self.position += v
-
-    def collision_circle(self) -> CollisionCircle:
-        return CollisionCircle(self.position.copy(), self.size)
-
-    def eat_food(self, food: Food):
-        self.size = (self.size**2 + food.radius**2) ** 0.5
-
-    def eat_blob(self, blob: Blob):
-        self.size = (self.size**2 + blob.size**2) ** 0.6
+        draw = pygame.draw.circle
+        for i in range(n):
+            draw(screen, colors[color[i]], (sx[i], sy[i]), radii[i])
+        return n
@@ -1,28 +1,543 @@
-from pygame import Color, Vector2
+import math
+from concurrent.futures import Executor
+from typing import Optional, Protocol, Sequence
+
+import numpy as np
 import pygame
+from pygame import Color, Vector2
+
 from camera import Camera
-from collision_circle import CollisionCircle
 
+colors = [
+    Color(255, 0, 0),  # red
+    Color(0, 255, 0),  # green
+    Color(0, 0, 255),  # blue
+    Color(255, 255, 0),  # yellow
+    Color(128, 0, 128),  # purple
+    Color(255, 165, 0),  # orange
+    Color(165, 42, 42),  # brown
+    Color(255, 192, 203),  # pink
+    Color(0, 255, 255),  # cyan
+]
 
-class Food:
-    def __init__(self, pos: Vector2, radius: int, color: Color) -> None:
-        self.position = pos
-        self.radius = radius
-        self.color = color
-
-    def render(self, screen, camera: Camera):
-        # screen_pos = self.position - player_position + pygame.Vector2(
-        #     screen.get_width() / 2,
-        #     screen.get_height() / 2
-        # )
-        screen_pos = camera.to_screen_pos(screen, self.position)
-
-        pygame.draw.circle(
-            screen,
-            self.color,
-            (int(screen_pos.x), int(screen_pos.y)),
-            self.radius * camera.zoom,
+
+# all the food in a chunk stored as parallel arrays
+# only the first `count` entries of each array are alive, eaten food
+# is removed by compacting the arrays so they stay contiguous
+class FoodStore:
+    MIN_RADIUS = 5
+    MAX_RADIUS = 20
+    # past this many unread changes layers just redraw everything
+    MAX_CHANGES = 64
+
+    def __init__(self, capacity: int, rng: Optional[np.random.Generator] = None) -> None:
+        self.capacity = capacity
+        self.count = 0
+        self.x = np.zeros(capacity, dtype=np.float32)
+        self.y = np.zeros(capacity, dtype=np.float32)
+        self.radius = np.zeros(capacity, dtype=np.uint8)
+        # index into `colors`
+        self.color = np.zeros(capacity, dtype=np.uint8)
+        self._rng = rng if rng is not None else np.random.default_rng()
+        # bumped on every change, with the world space box each change
+        # touched so cached drawings can patch just that part
+        # see FoodLayer
+        self.version = 0
+        self._changes_start = 0
+        self._changes: list[tuple[float, float, float, float]] = []
+        # (version, bounds) see bounds()
+        self._bounds: tuple[int, tuple[float, float, float, float, float]] = (-1, (0, 0, 0, 0, 0))
+
+    def __len__(self) -> int:
+        return self.count
+
+    def is_full(self) -> bool:
+        return self.count >= self.capacity
+
+    # spawns up to n pieces of food at random integer positions inside rect
+    # returns how many were actually spawned
+    def spawn(self, n: int, rect: pygame.Rect) -> int:
+        n = min(n, self.capacity - self.count)
+        if n <= 0:
+            return 0
+
+        s = slice(self.count, self.count + n)
+        rng = self._rng
+        self.x[s] = rng.integers(rect.left, rect.right, n, endpoint=True)
+        self.y[s] = rng.integers(rect.top, rect.bottom, n, endpoint=True)
+        self.radius[s] = rng.integers(self.MIN_RADIUS, self.MAX_RADIUS, n, endpoint=True)
+        self.color[s] = rng.integers(0, len(colors), n)
+        self.count += n
+        self._changed(s)
+        return n
+
+    def remove(self, indices: np.ndarray):
+        self._changed(indices)
+        n = self.count
+        keep = np.ones(n, dtype=bool)
+        keep[indices] = False
+        m = int(keep.sum())
+        for arr in (self.x, self.y, self.radius, self.color):
+            arr[:m] = arr[:n][keep]
+        self.count = m
+
+    # moves food i by (dx[i], dy[i])
+    def move(self, dx: np.ndarray, dy: np.ndarray):
+        moved = np.flatnonzero((dx != 0) | (dy != 0))
+        if len(moved) == 0:
+            return
+        old = self._box(moved)
+        self.x[moved] += dx[moved]
+        self.y[moved] += dy[moved]
+        new = self._box(moved)
+        self._changes.append(
+            (min(old[0], new[0]), min(old[1], new[1]), max(old[2], new[2]), max(old[3], new[3]))
         )
+        self._bump_version()
+
+    # replaces the food with food simulated somewhere else, ex a shard
+    # changes are the boxes it touched, or None if unknown, see changes_since
+    def assign(
+        self,
+        x: np.ndarray,
+        y: np.ndarray,
+        radius: np.ndarray,
+        color: np.ndarray,
+        changes: Optional[list[tuple[float, float, float, float]]],
+    ):
+        n = len(x)
+        self.x[:n] = x
+        self.y[:n] = y
+        self.radius[:n] = radius
+        self.color[:n] = color
+        self.count = n
+        if changes is None:
+            self._changes.clear()
+            self.version += 1
+            self._changes_start = self.version
+            return
+        for box in changes:
+            self._changes.append(box)
+            self._bump_version()
+
+    # the world space boxes changed since `version`, or None if there
+    # were too many to keep and everything should be treated as changed
+    def changes_since(self, version: int) -> Optional[list[tuple[float, float, float, float]]]:
+        if version < self._changes_start:
+            return None
+        return self._changes[version - self._changes_start:]
+
+    def _changed(self, indices):
+        self._changes.append(self._box(indices))
+        self._bump_version()
+
+    def _bump_version(self):
+        self.version += 1
+        if len(self._changes) > self.MAX_CHANGES:
+            self._changes.clear()
+            self._changes_start = self.version
+
+    # (left, top, right, bottom) around every piece of food's center and
+    # the largest radius, only recomputed after the food changes
+    def bounds(self) -> tuple[float, float, float, float, float]:
+        version, bounds = self._bounds
+        if version != self.version:
+            n = self.count
+            x = self.x[:n]
+            y = self.y[:n]
+            bounds = (float(x.min()), float(y.min()), float(x.max()), float(y.max()), float(self.radius[:n].max()))
+            self._bounds = (self.version, bounds)
+        return bounds
+
+    # bounding box of the given food, (left, top, right, bottom)
+    def _box(self, indices) -> tuple[float, float, float, float]:
+        x = self.x[indices]
+        y = self.y[indices]
+        r = self.radius[indices]
+        return (
+            float((x - r).min()),
+            float((y - r).min()),
+            float((x + r).max()),
+            float((y + r).max()),
+        )
+
+    # only draws the food overlapping `view`, a world space rect
+    # returns how many were drawn
+    def render(self, screen, camera: Camera, view: Optional[pygame.Rect] = None) -> int:
+        n = self.count
+        if n == 0:
+            return 0
+
+        x = self.x[:n]
+        y = self.y[:n]
+        radius = self.radius[:n]
+        color = self.color[:n]
+        if view is not None:
+            visible = (
+                (x + radius >= view.left)
+                & (x - radius <= view.right)
+                & (y + radius >= view.top)
+                & (y - radius <= view.bottom)
+            )
+            x = x[visible]
+            y = y[visible]
+            radius = radius[visible]
+            color = color[visible]
+            n = len(x)
+
+        half_w = screen.get_width() // 2
+        half_h = screen.get_height() // 2
+        zoom = camera.zoom
+        sx = ((x - camera.target.x) * zoom + half_w).astype(np.int32).tolist()
+        sy = ((y - camera.target.y) * zoom + half_h).astype(np.int32).tolist()
+        radii = (radius * zoom).tolist()
+        color = color.tolist()
+
+        draw = pygame.draw.circle
+        for i in range(n):
+            draw(screen, colors[color[i]], (sx[i], sy[i]), radii[i])
+        return n
+
+
+# the food of one store pre-drawn at one zoom, drawing it is a handful of
+# blits rather than a circle per piece of food
+# the layer is split into run length encoded tiles that are only made once
+# they're on screen, changes to the store are patched into the tiles they
+# touch so a piece of food being eaten doesn't re-encode the whole layer
+class FoodLayer:
+    TILE_SIZE = 256
+    # never one of the food colors
+    TRANSPARENT = Color(255, 0, 255)
+
+    # `rect` is the world space area the layer covers
+    def __init__(self, store: FoodStore, rect: pygame.Rect, zoom: float) -> None:
+        self.store = store
+        self.rect = rect
+        self.zoom = zoom
+        self.width = math.ceil(rect.width * zoom)
+        self.height = math.ceil(rect.height * zoom)
+        self._tiles: dict[tuple[int, int], pygame.Surface] = {}
+        self._version = store.version
+
+    # returns how many tiles were blitted
+    def render(self, screen, camera: Camera) -> int:
+        self._update()
+
+        # lined up on the centre so the difference between camera.zoom and
+        # the layer's zoom is split between both edges
+        center = camera.to_screen_pos(screen, Vector2(self.rect.center))
+        left = int(center.x - self.width / 2)
+        top = int(center.y - self.height / 2)
+        on_screen = pygame.Rect(-left, -top, screen.get_width(), screen.get_height())
+        on_screen = on_screen.clip(0, 0, self.width, self.height)
+        if not on_screen:
+            return 0
+
+        size = self.TILE_SIZE
+        blits = []
+        for tx in range(on_screen.left // size, (on_screen.right - 1) // size + 1):
+            for ty in range(on_screen.top // size, (on_screen.bottom - 1) // size + 1):
+                tile = self._tiles.get((tx, ty))
+                if tile is None:
+                    tile = self._make_tile(tx, ty)
+                blits.append((tile, (left + tx * size, top + ty * size)))
+        screen.blits(blits, doreturn=False)
+        return len(blits)
+
+    def _update(self):
+        store = self.store
+        if self._version == store.version:
+            return
+
+        changes = store.changes_since(self._version)
+        self._version = store.version
+        if changes is None:
+            self._tiles.clear()
+            return
+
+        zoom = self.zoom
+        for left, top, right, bottom in changes:
+            # a pixel of slack for circles rounding outwards
+            area = pygame.Rect(
+                math.floor((left - self.rect.left) * zoom) - 1,
+                math.floor((top - self.rect.top) * zoom) - 1,
+                math.ceil((right - left) * zoom) + 3,
+                math.ceil((bottom - top) * zoom) + 3,
+            )
+            for (tx, ty), tile in self._tiles.items():
+                tile_rect = self._tile_rect(tx, ty)
+                if tile_rect.colliderect(area):
+                    self._draw(tile, tile_rect, area.clip(tile_rect))
+
+    def _make_tile(self, tx: int, ty: int) -> pygame.Surface:
+        tile_rect = self._tile_rect(tx, ty)
+        tile = pygame.Surface(tile_rect.size)
+        tile.set_colorkey(self.TRANSPARENT, pygame.RLEACCEL)
+        self._draw(tile, tile_rect, tile_rect)
+        self._tiles[(tx, ty)] = tile
+        return tile
+
+    def _tile_rect(self, tx: int, ty: int) -> pygame.Rect:
+        size = self.TILE_SIZE
+        return pygame.Rect(tx * size, ty * size, size, size).clip(0, 0, self.width, self.height)
+
+    # redraws the part of the tile inside area, both in layer pixels
+    def _draw(self, tile: pygame.Surface, tile_rect: pygame.Rect, area: pygame.Rect):
+        local = area.move(-tile_rect.left, -tile_rect.top)
+        # held for the whole patch, otherwise every draw call below
+        # decodes the tile's run length encoding again
+        tile.lock()
+        tile.fill(self.TRANSPARENT, local)
+
+        store = self.store
+        n = store.count
+        zoom = self.zoom
+        x = (store.x[:n] - self.rect.left) * zoom
+        y = (store.y[:n] - self.rect.top) * zoom
+        radius = store.radius[:n] * zoom
+        hit = (
+            (x + radius >= area.left)
+            & (x - radius <= area.right)
+            & (y + radius >= area.top)
+            & (y - radius <= area.bottom)
+        )
+        if not hit.any():
+            tile.unlock()
+            return
+
+        sx = (x[hit] - tile_rect.left).astype(np.int32).tolist()
+        sy = (y[hit] - tile_rect.top).astype(np.int32).tolist()
+        radii = radius[hit].tolist()
+        color = store.color[:n][hit].tolist()
+
+        tile.set_clip(local)
+        draw = pygame.draw.circle
+        for i in range(len(sx)):
+            draw(tile, colors[color[i]], (sx[i], sy[i]), radii[i])
+        tile.set_clip(None)
+        tile.unlock()
+
+
+# below this many food/eater pairs numpy's per call overhead costs
+# more than just looping in python
+SMALL_BATCH = 64
+
+
+# tests every piece of food against every eater in one go
+# eaters are circles (ex, ey, er), food within `reach` of an eater that
+# isn't eaten gets pulled `amount` units towards that eater's target
+# returns (eaten_by, move_x, move_y) where eaten_by[i] is the index of the
+# first eater overlapping food i or -1 if it survived
+def food_eater_kernel(
+    fx: np.ndarray,
+    fy: np.ndarray,
+    fr: np.ndarray,
+    ex: np.ndarray,
+    ey: np.ndarray,
+    er: np.ndarray,
+    reach: np.ndarray,
+    tx: np.ndarray,
+    ty: np.ndarray,
+    amount: float,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    if len(fx) * len(ex) < SMALL_BATCH:
+        return _food_eater_kernel_python(fx, fy, fr, ex, ey, er, reach, tx, ty, amount)
+
+    # rows are food, columns are eaters
+    dx = ex[None, :] - fx[:, None]
+    dy = ey[None, :] - fy[:, None]
+    dist_sq = dx * dx + dy * dy
+    touching = er[None, :] + fr[:, None]
+    eats = dist_sq <= touching * touching
+
+    eaten = eats.any(axis=1)
+    eaten_by = np.where(eaten, eats.argmax(axis=1), -1)
+
+    # only a handful of pairs are ever close enough to attract so
+    # the direction maths is done on those pairs alone
+    attracts = (dist_sq < reach[None, :] ** 2) & ~eaten[:, None]
+    rows, cols = np.nonzero(attracts)
+    n = len(fx)
+    if len(rows) == 0:
+        return eaten_by, np.zeros(n), np.zeros(n)
+
+    ax = tx[cols] - fx[rows]
+    ay = ty[cols] - fy[rows]
+    dist = np.hypot(ax, ay)
+    # food sitting exactly on the target has no direction to move in
+    dist[dist == 0] = np.inf
+    scale = amount / dist
+    move_x = np.bincount(rows, weights=ax * scale, minlength=n)
+    move_y = np.bincount(rows, weights=ay * scale, minlength=n)
+    return eaten_by, move_x, move_y
+
+
+def _food_eater_kernel_python(
+    fx: np.ndarray,
+    fy: np.ndarray,
+    fr: np.ndarray,
+    ex: np.ndarray,
+    ey: np.ndarray,
+    er: np.ndarray,
+    reach: np.ndarray,
+    tx: np.ndarray,
+    ty: np.ndarray,
+    amount: float,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    eaters = list(zip(ex.tolist(), ey.tolist(), er.tolist(), reach.tolist(), tx.tolist(), ty.tolist()))
+    eaten_by = []
+    move_x = []
+    move_y = []
+    for x, y, r in zip(fx.tolist(), fy.tolist(), fr.tolist()):
+        eater = -1
+        for j, (bx, by, br, _, _, _) in enumerate(eaters):
+            d = (bx - x) ** 2 + (by - y) ** 2
+            if d <= (br + r) ** 2:
+                eater = j
+                break
+        eaten_by.append(eater)
+
+        mx = my = 0.0
+        if eater == -1:
+            for bx, by, _, breach, btx, bty in eaters:
+                if (bx - x) ** 2 + (by - y) ** 2 < breach**2:
+                    ax = btx - x
+                    ay = bty - y
+                    dist = math.hypot(ax, ay)
+                    if dist > 0:
+                        mx += ax / dist * amount
+                        my += ay / dist * amount
+        move_x.append(mx)
+        move_y.append(my)
+
+    return np.array(eaten_by, dtype=np.int64), np.array(move_x), np.array(move_y)
+
+
+# something with a position and size that can eat food, ex a Blob
+class FoodEater(Protocol):
+    # read only here so anything with a position and a numeric size fits
+    @property
+    def position(self) -> Vector2: ...
+
+    @property
+    def size(self) -> float: ...
+
+    def eat_food(self, radius: float): ...
+
+
+# resolves every eater against all the food in `stores`
+# food near an eater with a target is attracted towards that target
+# (targets[i] is None for eaters that don't attract food)
+# `others` are more eaters as (x, y, size) arrays, ex enemies from an
+# EnemySwarm, that come after `eaters` and never attract food. they're not
+# grown here, the area of food each ate is returned instead
+# with an executor the stores are resolved on its threads, see _plan_store
+def resolve_food(
+    stores: Sequence[FoodStore],
+    eaters: Sequence[FoodEater],
+    targets: Sequence[Optional[Vector2]],
+    attraction_radius: float = 0,
+    attraction: float = 0,
+    executor: Optional[Executor] = None,
+    others: Optional[tuple[np.ndarray, np.ndarray, np.ndarray]] = None,
+) -> np.ndarray:
+    n_others = len(others[0]) if others is not None else 0
+    eaten_area: np.ndarray = np.zeros(n_others)
+    stores = [s for s in stores if s.count > 0]
+    if not stores or not (eaters or n_others):
+        return eaten_area
+
+    ex = np.array([e.position.x for e in eaters], dtype=np.float32)
+    ey = np.array([e.position.y for e in eaters], dtype=np.float32)
+    er = np.array([e.size for e in eaters], dtype=np.float32)
+    reach = np.array(
+        [e.size + attraction_radius if t is not None else 0 for e, t in zip(eaters, targets)],
+        dtype=np.float32,
+    )
+    tx = np.array([t.x if t is not None else 0 for t in targets], dtype=np.float32)
+    ty = np.array([t.y if t is not None else 0 for t in targets], dtype=np.float32)
+    if others is not None:
+        ox, oy, osize = others
+        ex = np.concatenate([ex, ox.astype(np.float32)])
+        ey = np.concatenate([ey, oy.astype(np.float32)])
+        er = np.concatenate([er, osize.astype(np.float32)])
+        none = np.zeros(n_others, dtype=np.float32)
+        reach = np.concatenate([reach, none])
+        tx = np.concatenate([tx, none])
+        ty = np.concatenate([ty, none])
+
+    # which eaters are close enough to each store to eat or attract any of
+    # its food, all at once since most stores have none
+    bounds = np.array([store.bounds() for store in stores], dtype=np.float32)
+    left, top, right, bottom, max_radius = (bounds[:, i, None] for i in range(5))
+    dx = ex[None, :] - np.clip(ex[None, :], left, right)
+    dy = ey[None, :] - np.clip(ey[None, :], top, bottom)
+    r = np.maximum(er[None, :] + max_radius, reach[None, :])
+    near = dx * dx + dy * dy <= r * r
+    jobs = [(store, np.flatnonzero(row)) for store, row in zip(stores, near) if row.any()]
+    if not jobs:
+        return eaten_area
+
+    def plan(job: tuple[FoodStore, np.ndarray]) -> _FoodPlan:
+        return _plan_store(job[0], job[1], ex, ey, er, reach, tx, ty, attraction)
+
+    if executor is None or len(jobs) == 1:
+        plans = [plan(job) for job in jobs]
+    else:
+        plans = list(executor.map(plan, jobs))
+
+    # everything below changes eaters and stores so it happens here, in
+    # store order, whichever thread finished first
+    planned = [(store, p) for (store, _), p in zip(jobs, plans)]
+    eaten_by = np.concatenate([p.eaten_by for _, p in planned])
+    fr = np.concatenate([p.radius for _, p in planned])
+    eaten = eaten_by >= 0
+    any_eaten = eaten.any()
+    if any_eaten:
+        area = np.bincount(
+            eaten_by[eaten], weights=fr[eaten].astype(np.float64) ** 2, minlength=len(eaters) + n_others
+        )
+        for i in np.flatnonzero(area[: len(eaters)]).tolist():
+            eaters[i].eat_food(float(np.sqrt(area[i])))
+        eaten_area = area[len(eaters):]
+
+    for store, p in planned:
+        store.move(p.move_x, p.move_y)
+        if any_eaten:
+            store_eaten = np.flatnonzero(p.eaten_by >= 0)
+            if len(store_eaten) > 0:
+                store.remove(store_eaten)
+    return eaten_area
+
+
+# what happens to the food in one store, see food_eater_kernel
+# eaten_by indexes into all the eaters passed to resolve_food
+class _FoodPlan:
+    def __init__(self, eaten_by: np.ndarray, move_x: np.ndarray, move_y: np.ndarray, radius: np.ndarray) -> None:
+        self.eaten_by = eaten_by
+        self.move_x = move_x
+        self.move_y = move_y
+        self.radius = radius
+
 
-    def collision_circle(self) -> CollisionCircle:
-        return CollisionCircle(self.position.copy(), self.radius)
+# runs the kernel for one store against the `near` eaters
+# reads the store and eaters but changes nothing so stores can be planned
+# on several threads at once, numpy lets go of the GIL while it works
+def _plan_store(
+    store: FoodStore,
+    near: np.ndarray,
+    ex: np.ndarray,
+    ey: np.ndarray,
+    er: np.ndarray,
+    reach: np.ndarray,
+    tx: np.ndarray,
+    ty: np.ndarray,
+    amount: float,
+) -> _FoodPlan:
+    n = store.count
+    fr = store.radius[:n].astype(np.float32)
+    eaten_by, move_x, move_y = food_eater_kernel(
+        store.x[:n], store.y[:n], fr, ex[near], ey[near], er[near], reach[near], tx[near], ty[near], amount
+    )
+    eaten_by = np.where(eaten_by >= 0, near[eaten_by], -1)
+    return _FoodPlan(eaten_by, move_x, move_y, fr)
@@ -6,7 +6,9 @@ from typing import Optional, Tuple
 class JoystickController:
 
     
-    def __init__(self):
+    # index is which of the connected joysticks to use
+    def __init__(self, index: int = 0):
+        self.index = index
         self.joystick: Optional[pygame.joystick.Joystick] = None 
         self.deadzone = 0.1  # Deadzone for analog sticks
         self.connected = False
@@ -17,8 +19,8 @@ class JoystickController:
         pygame.joystick.init()
         
       
-        if pygame.joystick.get_count() > 0:
-            self.joystick = pygame.joystick.Joystick(0)
+        if pygame.joystick.get_count() > self.index:
+            self.joystick = pygame.joystick.Joystick(self.index)
             self.joystick.init() 
             self.connected = True
             print(f"Controller connected: {self.joystick.get_name()}")
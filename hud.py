@@ -1,8 +1,11 @@
+from typing import Optional
+
 import pygame
 from pygame import Vector2
 
 from player import Player
 from gamepad_controller import JoystickController
+from profiler import Profiler
 
 
 class Hud:
@@ -10,7 +13,7 @@ class Hud:
         self.screen = screen
         self.font = pygame.font.Font(None, 24)
 
-    def render(self, player: Player, controller: JoystickController = None, side: str = 'left'):
+    def render(self, player: Player, controller: Optional[JoystickController] = None, side: str = 'left'):
         self._draw_score(player.score(), side)
         if player.weapon is not None:
             self._draw_ammo(player.weapon.ammo, side)
@@ -44,3 +47,46 @@ class Hud:
         
         w, h = self.screen.get_size()
         self.screen.blit(text, Vector2(10, 10))
+
+
+# frame timings and counters drawn over the whole screen
+class PerfOverlay:
+    # redrawing the text every frame would show up in the timings
+    # it's meant to be measuring, so it only refreshes a few times a second
+    REFRESH_FRAMES = 15
+
+    def __init__(self, screen: pygame.Surface):
+        self.screen = screen
+        # monospace so the columns line up
+        self.font = pygame.font.SysFont("consolas,couriernew,monospace", 16)
+        self._lines: list[pygame.Surface] = []
+        self._frames = 0
+
+    def render(self, profiler: Profiler, stats: dict[str, int]):
+        if self._frames % self.REFRESH_FRAMES == 0:
+            self._lines = self._build_lines(profiler, stats)
+        self._frames += 1
+
+        line_h = self.font.get_linesize()
+        width = max((line.get_width() for line in self._lines), default=0)
+        x, y = 10, 40
+        backdrop = pygame.Surface((width + 12, line_h * len(self._lines) + 12), pygame.SRCALPHA)
+        backdrop.fill((0, 0, 0, 170))
+        self.screen.blit(backdrop, (x - 6, y - 6))
+        for line in self._lines:
+            self.screen.blit(line, (x, y))
+            y += line_h
+
+    def _build_lines(self, profiler: Profiler, stats: dict[str, int]) -> list[pygame.Surface]:
+        texts = [f"{'phase':<18}{'avg':>7}{'p99':>7}"]
+        total = 0.0
+        for name in profiler.phases():
+            avg = profiler.average_ms(name)
+            total += avg
+            texts.append(f"{name:<18}{avg:>7.2f}{profiler.percentile_ms(name, 99):>7.2f}")
+        texts.append(f"{'total':<18}{total:>7.2f}")
+        texts.append("")
+        for name, value in (*stats.items(), *profiler.counts.items()):
+            texts.append(f"{name:<18}{value:>7}")
+
+        return [self.font.render(text, True, "white") for text in texts]
@@ -0,0 +1,75 @@
+import numpy as np
+import pygame
+
+from player import Player
+
+# how closely things are simulated, by distance from the nearest player
+NEAR = 0
+MID = 1
+FAR = 2
+
+
+# decides what gets simulated each tick so a big world costs about what
+# the parts players can see cost
+#   near: within NEAR_RADIUS of a player, every tick
+#   mid: within MID_RADIUS, every MID_INTERVAL ticks with a dt to match
+#   far: enemies every FAR_INTERVAL ticks, chunks out here already sleep
+#     and grow the food they missed when they wake, see Chunk.wake
+# the radii grow with a player's size the same way their camera zooms out
+#
+# enemies and chunks are staggered by id so a tier's work is spread over
+# its interval instead of landing on one tick, and an enemy's tier is
+# decided each time it steps, so one a player is heading for goes through
+# the mid tier before it's near
+class LodScheduler:
+    NEAR_RADIUS = 1200
+    MID_RADIUS = 3000
+    MID_INTERVAL = 4
+    FAR_INTERVAL = 30
+
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self._intervals = np.array([1, self.MID_INTERVAL, self.FAR_INTERVAL])
+        # world rects that are near a player, see watch
+        self._near: list[pygame.Rect] = []
+
+    # where the players are this tick, `sizes` are their whole sizes
+    def watch(self, positions: np.ndarray, sizes: np.ndarray):
+        self._near = []
+        for (x, y), radius in zip(positions.tolist(), (self.NEAR_RADIUS * self.scales(sizes)).tolist()):
+            self._near.append(pygame.Rect(int(x - radius), int(y - radius), int(2 * radius), int(2 * radius)))
+
+    def scales(self, sizes: np.ndarray) -> np.ndarray:
+        return np.maximum(1, sizes / Player.STARTING_SIZE)
+
+    # indices of the enemies to step this tick and how many ticks each one
+    # has to catch up on
+    def due(self, tick: int, swarm) -> tuple[np.ndarray, np.ndarray]:
+        n = swarm.count
+        if not self.enabled:
+            return np.arange(n), np.ones(n, dtype=np.int64)
+        interval = self._intervals[swarm.tier[:n]]
+        due = np.flatnonzero((tick + swarm.ids[:n]) % interval == 0)
+        last = swarm.last_step[due]
+        # enemies that haven't stepped yet, ex just spawned, step one tick
+        ticks = np.where(last < 0, 1, np.minimum(tick - last, self.FAR_INTERVAL))
+        return due, ticks
+
+    # re-tiers the enemies that just stepped, from how far each is from
+    # its nearest player and that player's size
+    def retier(self, tick: int, swarm, due: np.ndarray, dist: np.ndarray, sizes: np.ndarray):
+        if not self.enabled:
+            return
+        scale = self.scales(sizes)
+        tier = np.full(len(due), FAR, dtype=np.int8)
+        tier[dist <= self.MID_RADIUS * scale] = MID
+        tier[dist <= self.NEAR_RADIUS * scale] = NEAR
+        swarm.tier[due] = tier
+        swarm.last_step[due] = tick
+
+    # whether a chunk resolves its food this tick, ones near a player
+    # always do and the rest every MID_INTERVAL ticks
+    def chunk_due(self, time: int, rect: pygame.Rect, stagger: int) -> bool:
+        if not self.enabled or (time + stagger) % self.MID_INTERVAL == 0:
+            return True
+        return rect.collidelist(self._near) >= 0
@@ -1,8 +1,20 @@
+import argparse
+
 from game import Game
+from simulation import Simulation
 
 
 def main():
-    game = Game()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--players", type=int, default=2, help="local players sharing the screen, 1 to 8")
+    parser.add_argument("--shards", type=int, default=1, help="processes to simulate the world in")
+    parser.add_argument("--food-threads", type=int, default=0, help="threads to resolve food on")
+    parser.add_argument("--enemies", type=int, default=Simulation.N_ENEMIES, help="enemies in the world")
+    args = parser.parse_args()
+
+    game = Game(
+        n_players=args.players, shards=args.shards, food_threads=args.food_threads, n_enemies=args.enemies
+    )
     game.run()
     game.deinit()
 
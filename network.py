@@ -0,0 +1,261 @@
+import asyncio
+import struct
+from typing import Awaitable, Callable, Optional, Protocol
+
+# transports for the server, see server.py
+# every one of them moves whole messages (bytes) between a server and its
+# clients, the server only ever sees Connections so which one is used
+# is up to whoever starts it
+
+
+# one end of a link between the server and a client
+class Connection(Protocol):
+    bytes_sent: int
+
+    def send(self, data: bytes): ...
+
+    # the next message, or None once the other end has gone
+    async def recv(self) -> Optional[bytes]: ...
+
+    def close(self): ...
+
+
+ConnectionHandler = Callable[[Connection], Awaitable[None]]
+
+
+class Transport(Protocol):
+    # calls handler with the server's end of every new connection
+    async def start(self, handler: ConnectionHandler): ...
+
+    # the client's end of a new connection to the server
+    async def connect(self) -> Connection: ...
+
+    async def close(self): ...
+
+
+# both ends live in this process and messages are handed over through
+# queues, for tests and for running bots next to a server
+# latency is in seconds and delays every message sent, to try out lag
+class LoopbackConnection:
+    def __init__(self, inbox: asyncio.Queue, outbox: asyncio.Queue, latency: float = 0) -> None:
+        self.bytes_sent = 0
+        self._inbox = inbox
+        self._outbox = outbox
+        self._closed = False
+        self._latency = latency
+        self._last_delivery = 0.0
+
+    def send(self, data: bytes):
+        if self._closed:
+            return
+        self.bytes_sent += len(data)
+        self._deliver(data)
+
+    async def recv(self) -> Optional[bytes]:
+        if self._closed:
+            return None
+        return await self._inbox.get()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        # tells the other end
+        self._deliver(None)
+
+    def _deliver(self, data: Optional[bytes]):
+        if self._latency <= 0:
+            self._outbox.put_nowait(data)
+            return
+        loop = asyncio.get_running_loop()
+        # timers due at the same time can fire in any order, keep them apart
+        # so messages arrive in the order they were sent
+        when = max(loop.time() + self._latency, self._last_delivery + 1e-6)
+        self._last_delivery = when
+        loop.call_at(when, self._outbox.put_nowait, data)
+
+
+class LoopbackTransport:
+    # latency is one way, in seconds
+    def __init__(self, latency: float = 0) -> None:
+        self.latency = latency
+        self._handler: Optional[ConnectionHandler] = None
+        self._tasks: set[asyncio.Task] = set()
+
+    async def start(self, handler: ConnectionHandler):
+        self._handler = handler
+
+    async def connect(self) -> Connection:
+        assert self._handler is not None, "start() the transport first"
+        to_server: asyncio.Queue = asyncio.Queue()
+        to_client: asyncio.Queue = asyncio.Queue()
+        server_end = LoopbackConnection(to_server, to_client, self.latency)
+        client_end = LoopbackConnection(to_client, to_server, self.latency)
+        _spawn(self._tasks, self._handler(server_end))
+        return client_end
+
+    async def close(self):
+        await _cancel(self._tasks)
+
+
+# messages are prefixed with their length since tcp is a stream
+class TcpConnection:
+    HEADER = struct.Struct("<I")
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.bytes_sent = 0
+        self._reader = reader
+        self._writer = writer
+
+    def send(self, data: bytes):
+        if self._writer.is_closing():
+            return
+        self.bytes_sent += self.HEADER.size + len(data)
+        self._writer.write(self.HEADER.pack(len(data)) + data)
+
+    async def recv(self) -> Optional[bytes]:
+        try:
+            (size,) = self.HEADER.unpack(await self._reader.readexactly(self.HEADER.size))
+            return await self._reader.readexactly(size)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return None
+
+    def close(self):
+        self._writer.close()
+
+
+class TcpTransport:
+    # port 0 picks a free one, see `port` after start()
+    def __init__(self, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.host = host
+        self.port = port
+        self._server: Optional[asyncio.Server] = None
+        self._tasks: set[asyncio.Task] = set()
+
+    async def start(self, handler: ConnectionHandler):
+        def on_connect(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+            _spawn(self._tasks, handler(TcpConnection(reader, writer)))
+
+        self._server = await asyncio.start_server(on_connect, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def connect(self) -> Connection:
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        return TcpConnection(reader, writer)
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        await _cancel(self._tasks)
+
+
+# one datagram is one message, lost ones stay lost and there's no hang up
+# so the server has to time out clients that go quiet
+class UdpConnection:
+    def __init__(self, transport: asyncio.DatagramTransport, addr) -> None:
+        self.bytes_sent = 0
+        self.inbox: asyncio.Queue = asyncio.Queue()
+        self._transport = transport
+        self._addr = addr
+        self._closed = False
+
+    def send(self, data: bytes):
+        if self._closed:
+            return
+        self.bytes_sent += len(data)
+        self._transport.sendto(data, self._addr)
+
+    async def recv(self) -> Optional[bytes]:
+        if self._closed:
+            return None
+        return await self.inbox.get()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self.inbox.put_nowait(None)
+
+
+class _UdpServerProtocol(asyncio.DatagramProtocol):
+    def __init__(self, handler: ConnectionHandler, tasks: set[asyncio.Task]) -> None:
+        self._handler = handler
+        self._tasks = tasks
+        self._transport: Optional[asyncio.DatagramTransport] = None
+        # remote address -> its connection
+        self.connections: dict[tuple, UdpConnection] = {}
+
+    def connection_made(self, transport):
+        self._transport = transport
+
+    def datagram_received(self, data: bytes, addr):
+        assert self._transport is not None
+        connection = self.connections.get(addr)
+        if connection is None or connection._closed:
+            connection = UdpConnection(self._transport, addr)
+            self.connections[addr] = connection
+            _spawn(self._tasks, self._handler(connection))
+        connection.inbox.put_nowait(data)
+
+
+class _UdpClientProtocol(asyncio.DatagramProtocol):
+    def __init__(self) -> None:
+        self.connection: Optional[UdpConnection] = None
+
+    def datagram_received(self, data: bytes, addr):
+        if self.connection is not None:
+            self.connection.inbox.put_nowait(data)
+
+    def error_received(self, exc):
+        if self.connection is not None:
+            self.connection.close()
+
+
+class UdpTransport:
+    # port 0 picks a free one, see `port` after start()
+    def __init__(self, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.host = host
+        self.port = port
+        self._endpoint: Optional[asyncio.DatagramTransport] = None
+        self._clients: list[tuple[asyncio.DatagramTransport, UdpConnection]] = []
+        self._tasks: set[asyncio.Task] = set()
+
+    async def start(self, handler: ConnectionHandler):
+        loop = asyncio.get_running_loop()
+        self._endpoint, _ = await loop.create_datagram_endpoint(
+            lambda: _UdpServerProtocol(handler, self._tasks), local_addr=(self.host, self.port)
+        )
+        self.port = self._endpoint.get_extra_info("sockname")[1]
+
+    async def connect(self) -> Connection:
+        loop = asyncio.get_running_loop()
+        endpoint, protocol = await loop.create_datagram_endpoint(
+            _UdpClientProtocol, remote_addr=(self.host, self.port)
+        )
+        connection = UdpConnection(endpoint, None)
+        protocol.connection = connection
+        self._clients.append((endpoint, connection))
+        return connection
+
+    async def close(self):
+        # nothing tells clients the server's gone so hang them up here
+        for endpoint, connection in self._clients:
+            connection.close()
+            endpoint.close()
+        if self._endpoint is not None:
+            self._endpoint.close()
+        await _cancel(self._tasks)
+
+
+def _spawn(tasks: set[asyncio.Task], coro: Awaitable[None]):
+    # the loop only keeps weak references to tasks
+    task = asyncio.ensure_future(coro)
+    tasks.add(task)
+    task.add_done_callback(tasks.discard)
+
+
+async def _cancel(tasks: set[asyncio.Task]):
+    for task in list(tasks):
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
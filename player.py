@@ -1,31 +1,32 @@
 import pygame
 from pygame import Color, Surface, Vector2
-from pygame.key import ScancodeWrapper
-import time, math, random
+import math, random
 from weapon import Weapon
 from typing import Optional, Callable
 from utils import Bounds
-from food import Food
 
 import utils
 
 from camera import Camera
-from collision_circle import CollisionCircle
+from collision import circles_of, many_vs_many
 
 
 class Blob:
     COHESION_STRENGTH = 20
     MIN_SIZE = 10
     MAX_SIZE = 70
+    __slots__ = ("position", "prev_position", "size", "color", "camera")
 
     def __init__(
         self,
         pos: Vector2,
-        size: int,
+        size: float,
         color: pygame.Color,
         camera: Camera,
     ):
         self.position = pos
+        # position at the start of the last tick, used to smooth rendering
+        self.prev_position = pos.copy()
         self.size = size
         self.color = color
         self.camera = camera
@@ -34,47 +35,35 @@ class Blob:
         self,
         speed: Vector2,
         dt: float,
-        blobs: list["Blob"],
         center_of_mass: Vector2,
+        bounds: Bounds,
     ):
         speed += self._cohesion_force(center_of_mass)
         self.position += speed * dt
-        self.position.x = min(max(self.position.x, 0), 9000)
-        self.position.y = min(max(self.position.y, 0), 9000)
+        left, top = bounds.top_left
+        self.position.x = min(max(self.position.x, left), left + bounds.width)
+        self.position.y = min(max(self.position.y, top), top + bounds.height)
 
-        for other in blobs:
-            if other is self:
-                continue
-
-            delta = self.position - other.position
-            dist = delta.length()
-            min_dist = self.size + other.size
-
-            if dist < min_dist and dist > 0:
-                overlap = min_dist - dist
-                push_dir = delta.normalize()
-
-                self.position += push_dir * (overlap / 2)
-                other.position -= push_dir * (overlap / 2)
-
-    def eat_food(self, food: Food):
-        self.size = (self.size**2 + food.radius**2) ** 0.5
+    # radius is of a single piece of food, see FoodStore.eat
+    def eat_food(self, radius: float):
+        self.size = (self.size**2 + radius**2) ** 0.5
 
     def _cohesion_force(self, center_of_mass: Vector2) -> Vector2:
         if center_of_mass == self.position:
             return Vector2(0, 0)
         return (center_of_mass - self.position).normalize() * self.COHESION_STRENGTH
 
-    def render(self, screen):
+    # alpha is how far between the previous and current tick to draw
+    def render(self, screen, alpha: float = 1):
         pygame.draw.circle(
             screen,
             self.color,
-            self.camera.to_screen_pos(screen, self.position),
+            self.camera.to_screen_pos(screen, self.prev_position.lerp(self.position, alpha)),
             self.size * self.camera.zoom,
         )
 
-    # returns two new child blobs
-    def split(self) -> Optional[tuple["Blob", "Blob"]]:
+    # returns two new child blobs placed using `rng`
+    def split(self, rng: random.Random) -> Optional[tuple["Blob", "Blob"]]:
         if self.size <= self.MIN_SIZE:
             self.size = self.MIN_SIZE
             return None
@@ -85,13 +74,14 @@ class Blob:
         self.size = self.size // 2
         self.size = int(pygame.math.clamp(self.size, self.MIN_SIZE, self.MAX_SIZE))
 
-        res = self._spawn_blobs()
+        res = self._spawn_blobs(rng)
         if res is None:
             self.size = original_size
         return res
 
-    def _spawn_blobs(self) -> Optional[tuple["Blob", "Blob"]]:
+    def _spawn_blobs(self, rng: random.Random) -> Optional[tuple["Blob", "Blob"]]:
         positions = self._generate_blob_positions(
+            rng,
             2,
             self.size,
             self.position,
@@ -118,6 +108,7 @@ class Blob:
 
     def _generate_blob_positions(
         self,
+        rng: random.Random,
         num_circles,
         radius,
         center: Vector2,
@@ -131,8 +122,8 @@ class Blob:
 
         for _ in range(num_circles):
             for _ in range(max_attempts):
-                x = random.uniform(cx - half_size + radius, cx + half_size - radius)
-                y = random.uniform(cy - half_size + radius, cy + half_size - radius)
+                x = rng.uniform(cx - half_size + radius, cx + half_size - radius)
+                y = rng.uniform(cy - half_size + radius, cy + half_size - radius)
                 new_pos = Vector2(x, y)
 
                 if all(
@@ -145,9 +136,6 @@ class Blob:
 
         return positions
 
-    def collision_circle(self) -> CollisionCircle:
-        return CollisionCircle(self.position.copy(), self.size)
-
 
 class Player:
     STARTING_SIZE = 40
@@ -160,20 +148,25 @@ class Player:
     SMALLEST_BLOB_REABSORBTION_TIME = 3600
     VIRUS_COOLDOWN = 240
 
-    def __init__(self, pos: Vector2, color: Color) -> None:
+    # rng decides where blobs go when splitting, a Simulation passes its own
+    # so the split is part of the seeded game
+    def __init__(self, pos: Vector2, color: Color, rng: Optional[random.Random] = None) -> None:
+        self.random = rng if rng is not None else random.Random()
         self.speed = Vector2(0, 0)
         self.position = pos
-        self.size: int = self.STARTING_SIZE
+        self.prev_position = pos.copy()
+        self.size: float = self.STARTING_SIZE
         self.acceleration: int = 500
         self.color = color
         self.growth_rate = 1
-        self.last_split: float = 0
+        # ticks until the player can split again
+        self.split_cooldown = 0
         self.camera = Camera(self.position)
         self.weapon: Optional[Weapon] = None
         self.smallest_blob = 0
         self.smallest_blob_timer = 0
-        # place holder value
-        self.bounds = Bounds(Vector2(0, 0), 0, 0)
+        # place holder value, the simulation sets this to the world's bounds
+        self.bounds = Bounds(Vector2(0, 0), 9000, 9000)
         # hacky way of communicating to World that the key
         # required to pick up a weapon is pressed
         self.can_pickup_weapon = False
@@ -190,65 +183,26 @@ class Player:
             )
         ]
 
-    def update(self, screen, keys: ScancodeWrapper, dt: float, controller=None, use_arrow_keys=False):
+    def update(self, controls: "PlayerInput", dt: float):
+        # every blob was eaten, there's nothing left to move
+        if not self.blobs:
+            return
+
         self.frames_since_last_virus += 1
-        
-        moving = False
-        
-        if keys is not None:
-            if use_arrow_keys:
-                if keys[pygame.K_UP]:
-                    self.speed.y -= self.acceleration * dt
-                    moving = True
-                if keys[pygame.K_DOWN]:
-                    self.speed.y += self.acceleration * dt
-                    moving = True
-                if keys[pygame.K_LEFT]:
-                    self.speed.x -= self.acceleration * dt
-                    moving = True
-                if keys[pygame.K_RIGHT]:
-                    self.speed.x += self.acceleration * dt
-                    moving = True
-            else:
-                if keys[pygame.K_w]:
-                    self.speed.y -= self.acceleration * dt
-                    moving = True
-                if keys[pygame.K_s]:
-                    self.speed.y += self.acceleration * dt
-                    moving = True
-                if keys[pygame.K_a]:
-                    self.speed.x -= self.acceleration * dt
-                    moving = True
-                if keys[pygame.K_d]:
-                    self.speed.x += self.acceleration * dt
-                    moving = True
-
-        if controller and controller.is_connected():
-            movement_vector = controller.get_movement_vector()
-            if movement_vector.length() > 0:
-                self.speed.x += movement_vector.x * self.acceleration * dt
-                self.speed.y += movement_vector.y * self.acceleration * dt
-                moving = True
+
+        moving = controls.move.length_squared() > 0
+        if moving:
+            self.speed += controls.move * self.acceleration * dt
 
         if self.weapon is None:
-            if use_arrow_keys:
-                keyboard_pickup = keys is not None and keys[pygame.K_RSHIFT]
-            else:
-                keyboard_pickup = keys is not None and keys[pygame.K_e]
-            controller_pickup = controller and controller.is_weapon_pickup_pressed()
-            self.can_pickup_weapon = keyboard_pickup or controller_pickup
+            self.can_pickup_weapon = controls.pickup
 
-        if use_arrow_keys:
-            keyboard_split = keys is not None and keys[pygame.K_RETURN]
-        else:
-            keyboard_split = keys is not None and keys[pygame.K_SPACE]
-        controller_split = controller and controller.is_split_pressed()
-        split_pressed = keyboard_split or controller_split
-        if split_pressed:
-            current_time = time.time()
-            if self.last_split + self.SPLIT_COOLDOWN < current_time:
-                self.last_split = current_time
-                self._split()
+        # counts down first so a split lands on the tick the cooldown ends
+        if self.split_cooldown > 0:
+            self.split_cooldown -= 1
+        if self.split_cooldown == 0 and controls.split:
+            self.split_cooldown = round(self.SPLIT_COOLDOWN / dt)
+            self._split()
 
         max_speed = self.MAX_SPEED / (self.size**0.5)
         if self.speed.x > max_speed:
@@ -293,7 +247,8 @@ class Player:
         self.position.y = center_of_mass.y
 
         for blob in self.blobs:
-            blob.update(scaled_speed, dt, self.blobs, center_of_mass)
+            blob.update(scaled_speed, dt, center_of_mass, self.bounds)
+        self._separate_blobs()
 
         if self.weapon is not None:
             if self.weapon.ammo <= 0:
@@ -301,7 +256,7 @@ class Player:
                 self.weapon_discard_callback(self.weapon.copy())
                 self.weapon = None
             else:
-                self._update_weapon(screen, dt)
+                self._update_weapon(controls, dt)
 
     def _calculate_center_of_mass(self) -> Vector2:
         center = Vector2(0, 0)
@@ -310,20 +265,23 @@ class Player:
 
         return center / self.size
 
-    def _update_weapon(self, screen, dt: float):
+    def _update_weapon(self, controls: "PlayerInput", dt: float):
         assert self.weapon is not None
-        if pygame.mouse.get_pressed()[0]:
-            pos = self.camera.to_screen_pos(screen, self.position)
-            self.weapon.spawn_bullet(utils.direction_to(pos, utils.mouse_pos()))
+        self.weapon.position = self.position
+        self.weapon.cool_down()
+        if controls.fire and controls.aim.length_squared() > 0:
+            self.weapon.spawn_bullet(controls.aim, dt)
 
         self.weapon.update(self.bounds, dt)
 
-    def _render_weapon(self, screen):
+    def _render_weapon(self, screen, alpha: float):
         assert self.weapon is not None
-        self.weapon.position = self.position
+        # draw it where the player is drawn, not where it is this tick
+        self.weapon.position = self.render_position(alpha)
         self.weapon.look_at(screen, self.camera, utils.mouse_pos())
         self.weapon.texture.rotation += 180
-        self.weapon.render(screen, self.camera)
+        self.weapon.render(screen, self.camera, alpha)
+        self.weapon.position = self.position
 
     def _split(self):
         if len(self.blobs) >= self.MAX_BLOBS:
@@ -334,7 +292,7 @@ class Player:
             if new_blob_count + 3 > self.MAX_BLOBS:
                 new_blobs.append(blob)
             else:
-                children = blob.split()
+                children = blob.split(self.random)
                 if children is not None:
                     new_blobs.append(children[0])
                     new_blobs.append(children[1])
@@ -342,23 +300,71 @@ class Player:
                     new_blobs.append(blob)
         self.blobs = new_blobs
 
-    def render(self, screen: Surface):
+    def render(self, screen: Surface, alpha: float = 1):
         for blob in self.blobs:
-            blob.render(screen)
+            blob.render(screen, alpha)
 
         if self.weapon is not None:
-            self._render_weapon(screen)
+            self._render_weapon(screen, alpha)
 
-    # returns a list of collision circles of all player blobs
-    def collision_circles(self) -> list[CollisionCircle]:
-        circles = []
+    # called by the simulation before every tick
+    def store_previous_state(self):
+        self.prev_position.update(self.position)
         for blob in self.blobs:
-            circles.append(blob.collision_circle())
-
-        return circles
+            blob.prev_position.update(blob.position)
+
+    # where the camera should point when drawing `alpha` of the way
+    # between the previous and current tick
+    def render_position(self, alpha: float) -> Vector2:
+        return self.prev_position.lerp(self.position, alpha)
+
+    # pushes apart overlapping blobs, half the overlap each way
+    # the pairs are found all at once after every blob has moved, positions
+    # are checked again before each push since earlier pushes move blobs
+    def _separate_blobs(self):
+        blobs = self.blobs
+        if len(blobs) < 2:
+            return
+        x, y, size = circles_of(blobs)
+        first, second = many_vs_many(x, y, size, x, y, size, strict=True)
+        # each pair once and never a blob with itself
+        once = first < second
+        for i, j in zip(first[once].tolist(), second[once].tolist()):
+            a = blobs[i]
+            b = blobs[j]
+            delta = a.position - b.position
+            dist_sq = delta.length_squared()
+            min_dist = a.size + b.size
+            if 0 < dist_sq < min_dist * min_dist:
+                dist = dist_sq**0.5
+                push = delta * ((min_dist - dist) / (2 * dist))
+                a.position += push
+                b.position -= push
 
     def score(self) -> int:
-        size = 0
+        size = 0.0
         for b in self.blobs:
             size += b.size
-        return size - self.STARTING_SIZE
+        return int(size - self.STARTING_SIZE)
+
+
+# everything a player can do in a single tick, built from the keyboard,
+# a controller or a bot so the simulation never touches input devices
+class PlayerInput:
+    def __init__(
+        self,
+        move: Optional[Vector2] = None,
+        split: bool = False,
+        pickup: bool = False,
+        discard: bool = False,
+        fire: bool = False,
+        aim: Optional[Vector2] = None,
+    ) -> None:
+        # each axis in [-1, 1]
+        self.move = move if move is not None else Vector2(0, 0)
+        self.split = split
+        self.pickup = pickup
+        self.discard = discard
+        self.fire = fire
+        # unit vector in world space
+        self.aim = aim if aim is not None else Vector2(0, 0)
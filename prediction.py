@@ -0,0 +1,90 @@
+from collections import deque
+from typing import Optional
+
+from pygame import Color, Vector2
+
+from player import Blob, Player, PlayerInput
+from snapshot import BLOBS, POSITION_SCALE, SIZE_SCALE, Snapshot
+from utils import Bounds
+
+
+# a prediction made for one input, kept until the server says it used it
+class _Predicted:
+    def __init__(self, sequence: int, controls: PlayerInput) -> None:
+        self.sequence = sequence
+        self.controls = controls
+        # the player's speed and blobs' center right after this input was
+        # applied, what the server should have too
+        self.speed = Vector2(0, 0)
+        self.position = Vector2(0, 0)
+
+
+# runs the client's own player ahead of the server so moving responds the
+# frame the input is sent instead of a round trip later
+#
+# every input is applied locally with the same Player.update the server
+# runs and kept until a snapshot says the server has used it, then the
+# player is reset to the server's blobs and the inputs the server hasn't
+# seen yet are applied again on top
+#
+# only movement is predicted, splits, weapons and eating happen on the
+# server and show up with the next snapshot
+class Predictor:
+    # inputs kept waiting for the server, about 2s at 60 ticks
+    MAX_PENDING = 120
+
+    def __init__(self, player_id: int, tick_rate: int, world_size: int, color: Color = Color("blue")) -> None:
+        self.player_id = player_id
+        self.dt = 1 / tick_rate
+        self.player = Player(Vector2(world_size / 2, world_size / 2), color)
+        self.player.bounds = Bounds(Vector2(0, 0), world_size, world_size)
+        self.player.blobs = []
+        # distance between where the last acked input was predicted to
+        # leave the player and where the server actually had it
+        self.error = 0.0
+        self._pending: deque[_Predicted] = deque()
+
+    def predict(self, sequence: int, controls: PlayerInput):
+        predicted = _Predicted(sequence, PlayerInput(controls.move))
+        self._pending.append(predicted)
+        if len(self._pending) > self.MAX_PENDING:
+            self._pending.popleft()
+        self.player.store_previous_state()
+        self._apply(predicted)
+
+    def reconcile(self, snapshot: Snapshot):
+        acked: Optional[_Predicted] = None
+        while self._pending and self._pending[0].sequence <= snapshot.ack:
+            acked = self._pending.popleft()
+
+        blobs = [
+            entity
+            for _, entity in sorted(snapshot.entities[BLOBS].items())
+            if entity[3] == self.player_id
+        ]
+        if not blobs:
+            # dead, or the server hasn't placed us yet
+            self.player.blobs = []
+            return
+
+        player = self.player
+        player.blobs = [
+            Blob(Vector2(x / POSITION_SCALE, y / POSITION_SCALE), size / SIZE_SCALE, player.color, player.camera)
+            for x, y, size, _ in blobs
+        ]
+        player.size = sum(blob.size for blob in player.blobs)
+        player.position.update(player._calculate_center_of_mass())
+        if acked is not None:
+            self.error = acked.position.distance_to(player.position)
+            # the server doesn't send speed, it's whatever we predicted
+            player.speed = acked.speed.copy()
+
+        for predicted in self._pending:
+            self._apply(predicted)
+
+    def _apply(self, predicted: _Predicted):
+        player = self.player
+        if player.blobs:
+            player.update(predicted.controls, self.dt)
+            predicted.position = player._calculate_center_of_mass()
+        predicted.speed = player.speed.copy()
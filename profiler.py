@@ -0,0 +1,152 @@
+import csv
+import time
+import tracemalloc
+from collections import deque
+
+
+class _Phase:
+    def __init__(self, profiler: "Profiler", name: str) -> None:
+        self._profiler = profiler
+        self._name = name
+        self._start = 0.0
+        self._start_memory = 0
+
+    def __enter__(self):
+        if self._profiler.track_memory:
+            tracemalloc.reset_peak()
+            self._start_memory = tracemalloc.get_traced_memory()[0]
+        self._start = time.perf_counter()
+
+    def __exit__(self, *_):
+        elapsed = time.perf_counter() - self._start
+        allocated = 0
+        if self._profiler.track_memory:
+            allocated = tracemalloc.get_traced_memory()[1] - self._start_memory
+        self._profiler._add(self._name, elapsed, allocated)
+
+
+class _NoPhase:
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *_):
+        pass
+
+
+_NO_PHASE = _NoPhase()
+
+
+# times named sections of a frame, a phase can run several times in one
+# frame (ex once per tick) and its times are summed until end_frame()
+# keeps the last `history` frames of each phase
+class Profiler:
+    def __init__(self, enabled: bool = True, history: int = 300) -> None:
+        self.enabled = enabled
+        # needs tracemalloc.start() to have been called
+        self.track_memory = False
+        self.history = history
+        self.frames = 0
+        # counters from the last finished frame, ex draw calls
+        self.counts: dict[str, int] = {}
+        self._frame_times: dict[str, float] = {}
+        self._frame_memory: dict[str, int] = {}
+        self._frame_counts: dict[str, int] = {}
+        self._times: dict[str, deque[float]] = {}
+        self._memory: dict[str, deque[int]] = {}
+        self._counts: dict[str, deque[int]] = {}
+        # every phase time of each frame, kept for write_csv
+        self._frames: deque[dict[str, float]] = deque(maxlen=history)
+
+    def phase(self, name: str):
+        if not self.enabled:
+            return _NO_PHASE
+        return _Phase(self, name)
+
+    def count(self, name: str, n: int = 1):
+        if self.enabled:
+            self._frame_counts[name] = self._frame_counts.get(name, 0) + n
+
+    def _add(self, name: str, elapsed: float, allocated: int):
+        self._frame_times[name] = self._frame_times.get(name, 0.0) + elapsed
+        self._frame_memory[name] = self._frame_memory.get(name, 0) + allocated
+
+    def end_frame(self):
+        if not self.enabled:
+            return
+
+        self.frames += 1
+        for name, elapsed in self._frame_times.items():
+            times = self._times.get(name)
+            if times is None:
+                times = self._times[name] = deque(maxlen=self.history)
+                self._memory[name] = deque(maxlen=self.history)
+            times.append(elapsed)
+            self._memory[name].append(self._frame_memory[name])
+        self._frames.append(self._frame_times)
+        for name, n in self._frame_counts.items():
+            counts = self._counts.get(name)
+            if counts is None:
+                counts = self._counts[name] = deque(maxlen=self.history)
+            counts.append(n)
+        self.counts = self._frame_counts
+        self._frame_times = {}
+        self._frame_counts = {}
+        self._frame_memory.clear()
+
+    def reset(self):
+        self.frames = 0
+        self.counts = {}
+        self._frame_times.clear()
+        self._frame_memory.clear()
+        self._frame_counts.clear()
+        self._times.clear()
+        self._memory.clear()
+        self._counts.clear()
+        self._frames.clear()
+
+    # one row per kept frame, one column of ms per phase
+    def write_csv(self, path: str):
+        phases = self.phases()
+        first = self.frames - len(self._frames)
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["frame", *phases])
+            for i, times in enumerate(self._frames):
+                writer.writerow(
+                    [first + i, *(round(times.get(name, 0.0) * 1000.0, 4) for name in phases)]
+                )
+
+    # in the order they were first seen
+    def phases(self) -> list[str]:
+        return list(self._times)
+
+    def counters(self) -> list[str]:
+        return list(self._counts)
+
+    # per frame, over the frames the counter was used in
+    def average_count(self, name: str) -> float:
+        counts = self._counts.get(name)
+        if not counts:
+            return 0.0
+        return sum(counts) / len(counts)
+
+    def average_ms(self, name: str) -> float:
+        times = self._times.get(name)
+        if not times:
+            return 0.0
+        return sum(times) / len(times) * 1000.0
+
+    def percentile_ms(self, name: str, percentile: float) -> float:
+        times = self._times.get(name)
+        if not times:
+            return 0.0
+        ordered = sorted(times)
+        i = min(int(len(ordered) * percentile / 100.0), len(ordered) - 1)
+        return ordered[i] * 1000.0
+
+    # average peak bytes allocated by the phase per frame
+    def average_bytes(self, name: str) -> float:
+        memory = self._memory.get(name)
+        if not memory:
+            return 0.0
+        return sum(memory) / len(memory)
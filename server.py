@@ -0,0 +1,347 @@
+import argparse
+import asyncio
+import random
+import statistics
+import struct
+import time
+from collections import deque
+from typing import Optional
+
+from pygame import Vector2
+
+from network import Connection, LoopbackTransport, TcpTransport, Transport, UdpTransport
+from player import Player, PlayerInput
+from prediction import Predictor
+from sharding import ShardedSimulation
+from simulation import Simulation
+from snapshot import MSG_SNAPSHOT, EntityIds, Snapshot, SnapshotDecoder, SnapshotEncoder
+
+# messages are a one byte type followed by its fields, little endian
+MSG_JOIN = 1
+MSG_WELCOME = 2
+MSG_INPUT = 3
+
+# type
+JOIN = struct.Struct("<B")
+# type, player id, tick rate, seed, world size
+WELCOME = struct.Struct("<BIHIi")
+# type, sequence number, newest snapshot tick received, move x, move y,
+# buttons, aim x, aim y
+INPUT = struct.Struct("<BIIffBff")
+SPLIT = 1
+PICKUP = 2
+DISCARD = 4
+FIRE = 8
+
+
+def encode_input(sequence: int, snapshot_tick: int, controls: PlayerInput) -> bytes:
+    buttons = (
+        SPLIT * controls.split
+        | PICKUP * controls.pickup
+        | DISCARD * controls.discard
+        | FIRE * controls.fire
+    )
+    return INPUT.pack(
+        MSG_INPUT,
+        sequence,
+        snapshot_tick,
+        controls.move.x,
+        controls.move.y,
+        buttons,
+        controls.aim.x,
+        controls.aim.y,
+    )
+
+
+# returns (sequence, snapshot tick, controls)
+def decode_input(data: bytes) -> tuple[int, int, PlayerInput]:
+    _, sequence, snapshot_tick, mx, my, buttons, ax, ay = INPUT.unpack(data)
+    controls = PlayerInput(
+        Vector2(mx, my),
+        bool(buttons & SPLIT),
+        bool(buttons & PICKUP),
+        bool(buttons & DISCARD),
+        bool(buttons & FIRE),
+        Vector2(ax, ay),
+    )
+    return sequence, snapshot_tick, controls
+
+
+# a connected client and the player they control
+class _Client:
+    def __init__(
+        self, connection: Connection, player_id: int, player: Player, snapshots: SnapshotEncoder
+    ) -> None:
+        self.connection = connection
+        self.player_id = player_id
+        self.player = player
+        self.snapshots = snapshots
+        self.inputs: deque[tuple[int, PlayerInput]] = deque()
+        # the input used last tick, repeated while no new ones arrive
+        self.controls = PlayerInput()
+        self.ack = 0
+
+
+# runs the one true copy of the game and tells clients what happens in it
+# clients only send their inputs, which are applied one per tick in order
+class Server:
+    TICK_RATE = 60
+    # inputs queued past this are dropped, oldest first, so a client that
+    # sends in bursts doesn't end up playing further and further behind
+    MAX_QUEUED_INPUTS = 4
+    # seconds without hearing from a client before it's dropped
+    CLIENT_TIMEOUT = 5.0
+    # ticks between forgetting the ids of entities that are gone
+    PRUNE_IDS_EVERY = 600
+
+    def __init__(
+        self,
+        transport: Transport,
+        tick_rate: int = TICK_RATE,
+        seed: Optional[int] = None,
+        shards: int = 1,
+        **sim_options,
+    ) -> None:
+        self.transport = transport
+        # nobody is playing until someone joins
+        if shards > 1:
+            self.sim: Simulation = ShardedSimulation(0, tick_rate, seed, shards=shards, **sim_options)
+        else:
+            self.sim = Simulation(0, tick_rate, seed, **sim_options)
+        self.clients: list[_Client] = []
+        self._ids: dict[Player, int] = {}
+        self._next_id = 1
+        self._entity_ids = EntityIds()
+        self._running = False
+
+    async def start(self):
+        await self.transport.start(self._serve)
+
+    # ticks until stop() is called or `ticks` ticks have run
+    async def run(self, ticks: Optional[int] = None):
+        self._running = True
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while self._running and (ticks is None or self.sim.tick < ticks):
+            self.tick()
+            next_tick += self.sim.dt
+            delay = next_tick - loop.time()
+            if delay < 0:
+                # fell behind, don't try to catch up with a burst of ticks
+                next_tick = loop.time()
+                delay = 0
+            await asyncio.sleep(delay)
+
+    def stop(self):
+        self._running = False
+
+    async def close(self):
+        self.stop()
+        for client in self.clients:
+            client.connection.close()
+        await self.transport.close()
+        if isinstance(self.sim, ShardedSimulation):
+            self.sim.close()
+
+    def tick(self):
+        inputs = []
+        for client in self.clients:
+            if client.inputs:
+                client.ack, client.controls = client.inputs.popleft()
+            inputs.append(client.controls)
+        self.sim.step(inputs)
+
+        for client in self.clients:
+            if not client.player.blobs:
+                self._respawn(client)
+        for client in self.clients:
+            client.connection.send(
+                client.snapshots.encode(self.sim, client.player, self._ids, client.ack)
+            )
+        if self.sim.tick % self.PRUNE_IDS_EVERY == 0:
+            self._prune_entity_ids()
+
+    def _prune_entity_ids(self):
+        sim = self.sim
+        alive = {blob for player in sim.players for blob in player.blobs}
+        alive.update(sim.viruses)
+        self._entity_ids.prune(alive)
+
+    def _respawn(self, client: _Client):
+        index = self.sim.players.index(client.player)
+        self.sim.remove_player(client.player)
+        del self._ids[client.player]
+        client.player = self.sim.add_player()
+        # keep players in the same order as clients, see tick()
+        self.sim.players.insert(index, self.sim.players.pop())
+        self._ids[client.player] = client.player_id
+
+    async def _serve(self, connection: Connection):
+        try:
+            data = await asyncio.wait_for(connection.recv(), self.CLIENT_TIMEOUT)
+        except asyncio.TimeoutError:
+            data = None
+        if data is None or data[0] != MSG_JOIN:
+            connection.close()
+            return
+
+        client = _Client(
+            connection, self._next_id, self.sim.add_player(), SnapshotEncoder(self._entity_ids)
+        )
+        self._next_id += 1
+        self._ids[client.player] = client.player_id
+        self.clients.append(client)
+        w, _ = self.sim.world.size()
+        connection.send(WELCOME.pack(MSG_WELCOME, client.player_id, self.sim.tick_rate, self.sim.seed, w))
+
+        try:
+            while True:
+                try:
+                    data = await asyncio.wait_for(connection.recv(), self.CLIENT_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                if data is None:
+                    break
+                if data[0] == MSG_INPUT:
+                    sequence, snapshot_tick, controls = decode_input(data)
+                    client.snapshots.ack(snapshot_tick)
+                    client.inputs.append((sequence, controls))
+                    if len(client.inputs) > self.MAX_QUEUED_INPUTS:
+                        client.inputs.popleft()
+        finally:
+            self.clients.remove(client)
+            del self._ids[client.player]
+            self.sim.remove_player(client.player)
+            connection.close()
+
+
+# the other end of Server, sends inputs and hands back snapshots
+class Client:
+    # seconds to wait for a welcome before asking again, joins over udp
+    # can get lost
+    JOIN_RETRY = 0.5
+
+    def __init__(self, connection: Connection) -> None:
+        self.connection = connection
+        self.player_id = 0
+        self.tick_rate = 0
+        self.seed = 0
+        self.world_size = 0
+        self._sequence = 0
+        self._snapshots = SnapshotDecoder()
+        # our own player as we expect the server to have it, set by join()
+        self.predictor: Optional[Predictor] = None
+
+    async def join(self, attempts: int = 10):
+        for _ in range(attempts):
+            self.connection.send(JOIN.pack(MSG_JOIN))
+            try:
+                while True:
+                    data = await asyncio.wait_for(self.connection.recv(), self.JOIN_RETRY)
+                    if data is None:
+                        raise ConnectionError("Server closed the connection")
+                    if data[0] == MSG_WELCOME:
+                        _, self.player_id, self.tick_rate, self.seed, self.world_size = WELCOME.unpack(data)
+                        self.predictor = Predictor(self.player_id, self.tick_rate, self.world_size)
+                        return
+            except asyncio.TimeoutError:
+                continue
+        raise ConnectionError("Server never answered")
+
+    # returns the input's sequence number, see Snapshot.ack
+    def send_input(self, controls: PlayerInput) -> int:
+        self._sequence += 1
+        self.connection.send(encode_input(self._sequence, self._snapshots.last_tick, controls))
+        if self.predictor is not None:
+            self.predictor.predict(self._sequence, controls)
+        return self._sequence
+
+    # the next snapshot from the server, or None if it's gone
+    async def receive(self) -> Optional[Snapshot]:
+        while True:
+            data = await self.connection.recv()
+            if data is None:
+                return None
+            if data[0] == MSG_SNAPSHOT:
+                snapshot = self._snapshots.decode(data)
+                if self.predictor is not None:
+                    self.predictor.reconcile(snapshot)
+                return snapshot
+
+    def close(self):
+        self.connection.close()
+
+
+# latency only applies to loopback, in seconds each way
+def make_transport(kind: str, host: str, port: int, latency: float = 0) -> Transport:
+    if kind == "tcp":
+        return TcpTransport(host, port)
+    if kind == "udp":
+        return UdpTransport(host, port)
+    return LoopbackTransport(latency)
+
+
+# a client that wanders about, sending an input for every snapshot it gets
+# errors gets the prediction error after each snapshot
+async def _bot(transport: Transport, seed: int, errors: list[float]):
+    client = Client(await transport.connect())
+    await client.join()
+    assert client.predictor is not None
+    rng = random.Random(seed)
+    move = Vector2(0, 0)
+    while True:
+        snapshot = await client.receive()
+        if snapshot is None:
+            return
+        errors.append(client.predictor.error)
+        if rng.random() < 0.05:
+            move = Vector2(rng.uniform(-1, 1), rng.uniform(-1, 1))
+        client.send_input(PlayerInput(move))
+
+
+# runs a server with some bots connected to it in this process and reports
+# how fast it ticked and how much it sent, or with --listen just serves
+async def _main(args):
+    transport = make_transport(args.transport, args.host, args.port, args.ping / 2000)
+    server = Server(transport, args.tick_rate, args.seed, args.shards)
+    await server.start()
+    if args.listen:
+        print(f"Serving {args.transport} on {args.host}:{getattr(transport, 'port', '')}")
+        await server.run()
+        return
+
+    errors: list[float] = []
+    bots = [asyncio.ensure_future(_bot(transport, i, errors)) for i in range(args.clients)]
+    start = time.perf_counter()
+    await server.run(args.ticks)
+    elapsed = time.perf_counter() - start
+    sent = sum(client.connection.bytes_sent for client in server.clients)
+    clients = max(len(server.clients), 1)
+    await server.close()
+    await asyncio.gather(*bots, return_exceptions=True)
+
+    ticks = server.sim.tick
+    print(f"{ticks} ticks in {elapsed:.2f}s ({ticks / elapsed:.0f} ticks/s) with {args.clients} clients")
+    print(f"{len(errors)} snapshots received, {sent / clients / max(ticks, 1):.0f} bytes/tick per client")
+    # respawns and being pushed by viruses show up as a few huge errors
+    if errors:
+        print(f"{statistics.median(errors):.2f} units median prediction error")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs the game server")
+    parser.add_argument("--transport", choices=["loopback", "tcp", "udp"], default="loopback")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--tick-rate", type=int, default=Server.TICK_RATE)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--clients", type=int, default=8, help="bots to connect")
+    parser.add_argument("--ticks", type=int, default=600)
+    parser.add_argument("--shards", type=int, default=1, help="processes to simulate the world in")
+    parser.add_argument("--ping", type=float, default=0, help="round trip ms added to loopback")
+    parser.add_argument("--listen", action="store_true", help="serve until killed, without bots")
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
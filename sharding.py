@@ -0,0 +1,397 @@
+import multiprocessing
+import random
+from bisect import bisect_right
+from multiprocessing.connection import Connection
+from typing import Optional
+
+import numpy as np
+from pygame import Vector2
+
+from enemy import EnemySwarm
+from food import colors, resolve_food
+from lod import LodScheduler
+from simulation import Simulation
+from utils import circle_in_rect
+from world import Chunk
+
+# runs a Simulation with the world split into strips of chunk columns,
+# each simulated by its own worker process
+#
+# a shard owns the food in its chunks and every enemy whose center is in
+# its strip. the coordinator (the ShardedSimulation in the main process)
+# keeps players, viruses and weapons, and each tick:
+#   - sends every shard the players' blobs, which of its chunks are active
+#     and which of those resolve their food this tick, see lod.py
+#   - shards eat food, move and resolve their enemies against the blobs,
+#     all at the same time
+#   - merges what they send back: blob growth and deaths, enemies (handing
+#     ones that crossed into another strip to that shard next tick) and
+#     the food of chunks that changed, so the world can still be drawn
+#
+# a sharded run is deterministic for a given seed and shard count but not
+# the same game as an unsharded one, food and enemies near a strip's edge
+# only see what's on their side of it
+
+# (id, x, y, size, velocity, color, effect, effect time, tier, last step),
+# see EnemySwarm.rows
+EnemyState = tuple[int, float, float, float, float, int, int, float, int, int]
+# (chunk index, x, y, radius, color, changed boxes or None), see FoodStore.assign
+FoodState = tuple[int, np.ndarray, np.ndarray, np.ndarray, np.ndarray, Optional[list]]
+
+
+class ShardedSimulation(Simulation):
+    def __init__(self, *args, shards: int = 2, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.options["shards"] = shards
+        columns = self.world.CHUNKS_PER_AXIS
+        self.n_shards = max(1, min(shards, columns))
+        # first chunk column of each shard's strip
+        self._starts = [columns * i // self.n_shards for i in range(self.n_shards)]
+        self._arrivals: list[list[EnemyState]] = [[] for _ in range(self.n_shards)]
+        self._processes: list[multiprocessing.process.BaseProcess] = []
+        self._pipes: list[Connection] = []
+
+    # the shards start on the first tick so the world can still be set up
+    # after construction, ex by a benchmark
+    def start(self):
+        if self._pipes:
+            return
+        context = multiprocessing.get_context("spawn")
+        chunk_index = {chunk: i for i, chunk in enumerate(self.world.chunks)}
+        enemies = self.enemies
+        shard = self._shards_of(enemies.x[: enemies.count])
+        owned = [enemies.rows(np.flatnonzero(shard == i)) for i in range(self.n_shards)]
+
+        for i in range(self.n_shards):
+            chunks = []
+            for chunk in self.world.chunks:
+                if self.shard_of(chunk.position.x) == i:
+                    store = chunk.food
+                    n = store.count
+                    chunks.append(
+                        (
+                            chunk_index[chunk],
+                            (chunk.position.x, chunk.position.y),
+                            chunk._respawn_offset,
+                            (store.x[:n].copy(), store.y[:n].copy(), store.radius[:n].copy(), store.color[:n].copy()),
+                        )
+                    )
+            parent, child = context.Pipe()
+            process = context.Process(
+                target=_run_shard,
+                args=(
+                    child,
+                    i,
+                    self.n_shards,
+                    self.seed,
+                    self.dt,
+                    self.world.size()[0],
+                    chunks,
+                    owned[i],
+                    enemies.next_id,
+                    self.lod.enabled,
+                ),
+                daemon=True,
+            )
+            process.start()
+            child.close()
+            self._processes.append(process)
+            self._pipes.append(parent)
+
+    def close(self):
+        for pipe in self._pipes:
+            pipe.send(None)
+        for process in self._processes:
+            process.join()
+        self._pipes = []
+        self._processes = []
+
+    # which shard owns world x
+    def shard_of(self, x: float) -> int:
+        column = min(max(int(x // Chunk.CHUNK_SIZE), 0), self.world.CHUNKS_PER_AXIS - 1)
+        return bisect_right(self._starts, column) - 1
+
+    def _shards_of(self, x: np.ndarray) -> np.ndarray:
+        column = np.clip(x // Chunk.CHUNK_SIZE, 0, self.world.CHUNKS_PER_AXIS - 1)
+        return np.searchsorted(self._starts, column, side="right") - 1
+
+    def _step_world(self):
+        self.start()
+        profiler = self.profiler
+        world = self.world
+        world.time += 1
+
+        with profiler.phase("viruses"):
+            for player in self.players:
+                for blob in list(player.blobs):
+                    self._hit_viruses(player, blob)
+
+        with profiler.phase("world"):
+            self._watch_players()
+            groups, active = self._active_groups()
+            for chunk in world.active_chunks:
+                chunk.pickup_weapons(self.players)
+            players = [
+                (
+                    player.position.x,
+                    player.position.y,
+                    player.size,
+                    [(blob.position.x, blob.position.y, blob.size) for blob in player.blobs],
+                )
+                for player in self.players
+            ]
+            for i, pipe in enumerate(self._pipes):
+                pipe.send((world.time, groups[i], active[i], players, self._arrivals[i]))
+            results = [pipe.recv() for pipe in self._pipes]
+
+        with profiler.phase("merge"):
+            self._merge(results)
+
+        with profiler.phase("broadphase"):
+            self._rebuild_broadphase()
+
+    # chunks around each player that resolve their food this tick, in the
+    # order World.update resolves them, and every active chunk, both split
+    # up by shard
+    def _active_groups(self) -> tuple[list[list[list[int]]], list[list[int]]]:
+        world = self.world
+        radius = self.ACTIVE_CHUNK_RADIUS
+        chunk_index = {chunk: i for i, chunk in enumerate(world.chunks)}
+        groups: list[list[list[int]]] = [[] for _ in range(self.n_shards)]
+        active: dict[Chunk, None] = {}
+        for player in self.players:
+            chunks = [c for c in world.chunks_around(player.position, radius, radius) if c not in active]
+            active.update(dict.fromkeys(chunks))
+            by_shard: list[list[int]] = [[] for _ in range(self.n_shards)]
+            for chunk in chunks:
+                if self.lod.chunk_due(world.time, chunk.rect(), chunk._respawn_offset):
+                    by_shard[self.shard_of(chunk.position.x)].append(chunk_index[chunk])
+            for i, group in enumerate(by_shard):
+                if group:
+                    groups[i].append(group)
+
+        # the shards wake and sleep their own chunks, these are just for drawing
+        for chunk in world.active_chunks:
+            chunk.awake = False
+        for chunk in active:
+            chunk.awake = True
+        world.active_chunks = list(active)
+        active_by_shard: list[list[int]] = [[] for _ in range(self.n_shards)]
+        for chunk in active:
+            active_by_shard[self.shard_of(chunk.position.x)].append(chunk_index[chunk])
+        return groups, active_by_shard
+
+    def _merge(self, results: list[tuple]):
+        growth = [[0.0] * len(player.blobs) for player in self.players]
+        eaten = [[False] * len(player.blobs) for player in self.players]
+        enemies = []
+        self._arrivals = [[] for _ in range(self.n_shards)]
+        chunks = self.world.chunks
+
+        for blobs, states, leaving, food in results:
+            for p, results_for_player in enumerate(blobs):
+                for b, (grown, was_eaten) in enumerate(results_for_player):
+                    growth[p][b] += grown
+                    eaten[p][b] = eaten[p][b] or was_eaten
+            enemies.append(states)
+            for state in leaving:
+                self._arrivals[self.shard_of(state[1])].append(state)
+            for index, x, y, radius, color, changes in food:
+                chunks[index].food.assign(x, y, radius, color, changes)
+
+        for p, player in enumerate(self.players):
+            for blob, grown in zip(player.blobs, growth[p]):
+                if grown:
+                    blob.size = (blob.size**2 + grown) ** 0.5
+            player.blobs = [blob for blob, dead in zip(player.blobs, eaten[p]) if not dead]
+        # (ids, x, y, size, color) arrays from each shard
+        self.enemies.assign(*(np.concatenate(field) for field in zip(*enemies)))
+
+
+# one of a player's blobs as a shard sees it, tracks what happens to it
+# so the coordinator can apply it to the real one
+class _Blob:
+    __slots__ = ("position", "size", "start_size", "eaten")
+
+    def __init__(self, x: float, y: float, size: float) -> None:
+        self.position = Vector2(x, y)
+        self.size = size
+        self.start_size = size
+        self.eaten = False
+
+    def eat_food(self, radius: float):
+        self.size = (self.size**2 + radius**2) ** 0.5
+
+
+# the part of the world one worker process simulates
+class _Shard:
+    def __init__(
+        self,
+        index: int,
+        n_shards: int,
+        seed: int,
+        dt: float,
+        world_size: int,
+        chunks: list[tuple],
+        enemies: list[EnemyState],
+        first_new_id: int,
+        lod: bool,
+    ) -> None:
+        self.dt = dt
+        self.lod = LodScheduler(lod)
+        self.world_size = world_size
+        self.random = random.Random(seed * n_shards + index)
+        rng = np.random.default_rng([seed, index])
+        self.chunks: dict[int, Chunk] = {}
+        self.left = min((position[0] for _, position, _, _ in chunks), default=0)
+        self.right = max((position[0] for _, position, _, _ in chunks), default=0) + Chunk.CHUNK_SIZE
+        for i, position, offset, (x, y, radius, color) in chunks:
+            chunk = Chunk(Vector2(position), rng, offset)
+            chunk.food.assign(x, y, radius, color, None)
+            self.chunks[i] = chunk
+        # food version last sent to the coordinator
+        self._sent = {i: chunk.food.version for i, chunk in self.chunks.items()}
+        self.awake: set[int] = set()
+        self.enemies = EnemySwarm()
+        # shards hand out ids from the same sequence without overlapping
+        self.enemies.next_id = first_new_id + index
+        self.enemies.id_step = n_shards
+        self.enemies.add_rows(enemies)
+
+    def step(
+        self,
+        time: int,
+        groups: list[list[int]],
+        active_chunks: list[int],
+        players: list[tuple],
+        arrivals: list[EnemyState],
+    ):
+        enemies = self.enemies
+        enemies.add_rows(arrivals)
+
+        active = set(active_chunks)
+        for i in self.awake - active:
+            self.chunks[i].sleep(time)
+        for i in sorted(active - self.awake):
+            self.chunks[i].wake(time)
+        self.awake = active
+
+        blobs = [[_Blob(*blob) for blob in player[3]] for player in players]
+        for group in groups:
+            self._update_food([self.chunks[i] for i in group], players, blobs)
+        for i in sorted(active):
+            self.chunks[i].respawn_food(time)
+
+        for player, player_blobs in zip(players, blobs):
+            self._collide_enemies(player, player_blobs)
+        # see Simulation._step_enemies
+        alive = [player for player in players if player[3]]
+        if alive:
+            targets = np.array([(player[0], player[1]) for player in alive])
+            biggest = np.array([max(blob[2] for blob in player[3]) for player in alive])
+            due, ticks = self.lod.due(time, enemies)
+            nearest, dist = enemies.step(targets, biggest, self.dt, self.world_size, due, ticks)
+            sizes = np.array([player[2] for player in alive], dtype=np.float64)
+            self.lod.retier(time, enemies, due, dist, sizes[nearest])
+            enemies.remove_dead()
+
+        n = enemies.count
+        states = tuple(a[:n].copy() for a in (enemies.ids, enemies.x, enemies.y, enemies.size, enemies.color))
+        x = enemies.x[:n]
+        gone = np.flatnonzero((x < self.left) | (x >= self.right))
+        leaving = enemies.rows(gone)
+        enemies.remove(gone)
+
+        food = []
+        for i, chunk in self.chunks.items():
+            store = chunk.food
+            if store.version != self._sent[i]:
+                changes = store.changes_since(self._sent[i])
+                n = store.count
+                food.append(
+                    (
+                        i,
+                        store.x[:n].copy(),
+                        store.y[:n].copy(),
+                        store.radius[:n].copy(),
+                        store.color[:n].copy(),
+                        list(changes) if changes is not None else None,
+                    )
+                )
+                self._sent[i] = store.version
+
+        results = [[(b.size**2 - b.start_size**2, b.eaten) for b in player_blobs] for player_blobs in blobs]
+        return results, states, leaving, food
+
+    # World._update_food with only this shard's enemies
+    def _update_food(self, chunks: list[Chunk], players: list[tuple], blobs: list[list[_Blob]]):
+        area = chunks[0].rect().unionall([chunk.rect() for chunk in chunks[1:]])
+        reach = area.inflate(2 * Chunk.FOOD_ATTRACTION_RADIUS, 2 * Chunk.FOOD_ATTRACTION_RADIUS)
+        eaters = []
+        targets = []
+        for player, player_blobs in zip(players, blobs):
+            target = Vector2(player[0], player[1])
+            for blob in player_blobs:
+                if circle_in_rect(blob.position, blob.size, reach):
+                    eaters.append(blob)
+                    targets.append(target)
+        enemies = self.enemies
+        near = enemies.in_rect(area)
+        eaten = resolve_food(
+            [chunk.food for chunk in chunks],
+            eaters,
+            targets,
+            Chunk.FOOD_ATTRACTION_RADIUS,
+            Chunk.FOOD_ATTRACTION,
+            others=(enemies.x[near], enemies.y[near], enemies.size[near]),
+        )
+        enemies.eat_food(near, eaten)
+
+    # Simulation._collide_enemies without the viruses, those stay with
+    # the coordinator
+    def _collide_enemies(self, player: tuple, blobs: list[_Blob]):
+        blobs = [blob for blob in blobs if not blob.eaten]
+        if not blobs:
+            return
+        enemies = self.enemies
+        player_size = player[2]
+        eaten_enemies: set[int] = set()
+
+        near, touching = enemies.touching(blobs)
+        for blob, row in zip(blobs, touching):
+            for i in near[row].tolist():
+                if i in eaten_enemies:
+                    continue
+                size = float(enemies.size[i])
+                if size < blob.size:
+                    blob.size = (blob.size**2 + size**2) ** 0.5
+                    eaten_enemies.add(i)
+                    self._spawn_enemy(player_size)
+                else:
+                    enemies.eat_blob(i, blob.size)
+                    blob.eaten = True
+                break
+
+        if eaten_enemies:
+            enemies.remove(list(eaten_enemies))
+
+    # replaces an eaten enemy somewhere random, likely in another shard
+    # which gets it at the end of the tick
+    def _spawn_enemy(self, player_size: float):
+        rng = self.random
+        self.enemies.spawn(
+            np.array([rng.randint(1000, self.world_size)]),
+            np.array([rng.randint(1000, self.world_size)]),
+            np.array([rng.randint(int(player_size // 2), int(player_size * 1.5))]),
+            np.array([rng.randrange(len(colors))]),
+        )
+
+
+def _run_shard(pipe: Connection, *args):
+    shard = _Shard(*args)
+    while True:
+        message = pipe.recv()
+        if message is None:
+            break
+        pipe.send(shard.step(*message))
+    pipe.close()
@@ -0,0 +1,425 @@
+import random
+import struct
+import time
+import zlib
+from typing import Any, Optional
+
+import numpy as np
+
+import pygame
+from pygame import Vector2
+
+import utils
+
+from collision import circles_of, circles_touch, many_vs_many
+from enemy import EnemySwarm
+from food import colors
+from lod import LodScheduler
+from player import Blob, Player, PlayerInput
+from profiler import Profiler
+from spatial_hash import SpatialHash
+from texture import Texture
+from virus import Virus
+from weapon import Effect, Weapon
+from world import Chunk, World
+
+
+class Weapons:
+    def __init__(self):
+        self.glock = Weapon(
+            Vector2(0, 0),
+            Effect.SLOW_DOWN,
+            4,
+            8,
+            Texture("textures/gun.webp"),
+        )
+        self.glock.texture.scale = Vector2(0.1, 0.1)
+
+        self.raygun = Weapon(
+            Vector2(0, 0),
+            Effect.DAMAGE,
+            1,
+            4,
+            Texture("textures/raygunpng.webp"),
+        )
+        self.raygun.texture.scale = Vector2(0.25, 0.25)
+
+        self.bazzoka = Weapon(
+            Vector2(0, 0),
+            Effect.ANNIHILATION,
+            3,
+            2,
+            Texture("textures/bazookapng.webp"),
+        )
+        self.bazzoka.texture.scale = Vector2(0.6, 0.6)
+        self.bazzoka.radius = 12
+        self.bazzoka.bullet_speed = 600
+
+    def as_list(self) -> list[Weapon]:
+        return [
+            self.glock, self.raygun, self.bazzoka
+        ]
+
+    def find_equivalent_weapon(self, other: Weapon) -> Optional[Weapon]:
+        for weapon in self.as_list():
+            if self._weapon_mostly_equals(weapon, other):
+                return weapon
+        return None
+
+    def _weapon_mostly_equals(self, w1: Weapon, w2: Weapon) -> bool:
+        return (
+            w1.fire_rate == w2.fire_rate
+            and w1.effect == w2.effect
+            and w1.texture == w2.texture
+            and w1.bullet_speed == w2.bullet_speed
+        )
+
+
+# all of the game state and rules with no dependency on a window,
+# Game draws this, but it can also be stepped on its own
+class Simulation:
+    TICK_RATE = 60
+    N_ENEMIES = 50
+    N_VIRUSES = 20
+    # chunks this many cells away from a player get their food simulated
+    ACTIVE_CHUNK_RADIUS = 2
+
+    def __init__(
+        self,
+        n_players: int = 2,
+        tick_rate: int = TICK_RATE,
+        seed: Optional[int] = None,
+        n_enemies: int = N_ENEMIES,
+        n_viruses: int = N_VIRUSES,
+        chunks_per_axis: int = World.CHUNKS_PER_AXIS,
+        food_threads: int = 0,
+        lod: bool = True,
+    ) -> None:
+        self.tick = 0
+        self.tick_rate = tick_rate
+        self.dt = 1 / tick_rate
+        self.game_over = False
+
+        # every random decision comes from these so the same seed and
+        # inputs always play out the same way
+        self.seed = seed if seed is not None else random.randrange(2**32)
+        self.random = random.Random(self.seed)
+        self.rng = np.random.default_rng(self.seed)
+        # what this was built with, a Replay builds the same game from it
+        self.options: dict[str, Any] = dict(
+            n_players=n_players,
+            tick_rate=tick_rate,
+            seed=self.seed,
+            n_enemies=n_enemies,
+            n_viruses=n_viruses,
+            chunks_per_axis=chunks_per_axis,
+            food_threads=food_threads,
+            lod=lod,
+        )
+
+        # only used for timing phases, see profiler.py
+        self.profiler = Profiler(enabled=False)
+        # what far from the players is simulated less often, see lod.py
+        self.lod = LodScheduler(lod)
+
+        world_size = chunks_per_axis * Chunk.CHUNK_SIZE
+        self.players: list[Player] = []
+        for i in range(n_players):
+            start = Vector2(world_size * (i + 0.5) / n_players, world_size * 0.5)
+            self.players.append(self._new_player(start))
+
+        self.world = World(self.players, self.rng, chunks_per_axis, food_threads)
+        for player in self.players:
+            player.bounds = self.world.bounds()
+
+        self.enemies = self._spawn_enemies(n_enemies)
+        self.viruses = self._spawn_viruses(n_viruses)
+        self._virus_hash: SpatialHash[Virus] = SpatialHash()
+
+        self.weapons = Weapons()
+        self._spawn_weapons()
+        # so there's something to draw before the first tick
+        self._rebuild_broadphase()
+
+    # advances the game by one tick
+    # inputs[i] is what players[i] is doing this tick
+    def step(self, inputs: list[PlayerInput]):
+        self.tick += 1
+        self._store_previous_state()
+        profiler = self.profiler
+
+        with profiler.phase("players"):
+            for player, controls in zip(self.players, inputs):
+                if controls.discard:
+                    self._drop_weapon(player)
+                player.update(controls, self.dt)
+
+        self._step_world()
+
+        with profiler.phase("player vs player"):
+            self._player_vs_player_eat()
+
+        if any(len(player.blobs) <= 0 for player in self.players):
+            self.game_over = True
+
+    # food, enemies and viruses, see ShardedSimulation for another way
+    def _step_world(self):
+        profiler = self.profiler
+        with profiler.phase("broadphase"):
+            self._rebuild_broadphase()
+        with profiler.phase("world"):
+            self._watch_players()
+            self.world.update(self.enemies, self.ACTIVE_CHUNK_RADIUS, self.lod)
+
+        with profiler.phase("enemies"):
+            for player in self.players:
+                self._collide_enemies(player)
+            self._step_enemies()
+
+    def _watch_players(self):
+        players = [p for p in self.players if p.blobs]
+        positions = np.array([(p.position.x, p.position.y) for p in players]).reshape(-1, 2)
+        self.lod.watch(positions, np.array([p.size for p in players], dtype=np.float64))
+
+    # enemies chase whichever player is nearest and run from the ones
+    # with a blob bigger than them, far away ones less often, see lod.py
+    def _step_enemies(self):
+        players = [p for p in self.players if p.blobs]
+        if not players:
+            return
+        enemies = self.enemies
+        targets = np.array([(p.position.x, p.position.y) for p in players])
+        biggest = np.array([max(blob.size for blob in p.blobs) for p in players])
+        due, ticks = self.lod.due(self.tick, enemies)
+        nearest, dist = enemies.step(targets, biggest, self.dt, self.world.size()[0], due, ticks)
+        sizes = np.array([p.size for p in players], dtype=np.float64)
+        self.lod.retier(self.tick, enemies, due, dist, sizes[nearest])
+        enemies.remove_dead()
+
+    # for players joining a game already going, ex on a server
+    # they start somewhere random and are updated from the next tick
+    def add_player(self) -> Player:
+        w, h = self.world.size()
+        player = self._new_player(Vector2(self.random.randint(0, w), self.random.randint(0, h)))
+        player.bounds = self.world.bounds()
+        self.players.append(player)
+        return player
+
+    def remove_player(self, player: Player):
+        self._drop_weapon(player)
+        self.players.remove(player)
+
+    def _new_player(self, start: Vector2) -> Player:
+        player = Player(start, self.random.choice(colors), self.random)
+        player.weapon_discard_callback = self._weapon_discard_callback
+        return player
+
+    def _store_previous_state(self):
+        for player in self.players:
+            player.store_previous_state()
+        self.enemies.store_previous()
+
+    # crc of everything that moves, two runs with the same seed and
+    # inputs should always agree
+    def checksum(self) -> int:
+        crc = zlib.crc32(struct.pack("<q", self.tick))
+        for player in self.players:
+            for blob in player.blobs:
+                crc = zlib.crc32(struct.pack("<3d", blob.position.x, blob.position.y, blob.size), crc)
+        n = self.enemies.count
+        for array in (self.enemies.x, self.enemies.y, self.enemies.size):
+            crc = zlib.crc32(array[:n].tobytes(), crc)
+        for chunk in self.world.chunks:
+            n = chunk.food.count
+            crc = zlib.crc32(chunk.food.x[:n].tobytes(), crc)
+            crc = zlib.crc32(chunk.food.y[:n].tobytes(), crc)
+        return crc
+
+    # enemies and viruses overlapping a world space rect, ex what a camera sees
+    # enemies come back as indices into self.enemies, from a bounds test over
+    # the swarm's arrays, see EnemySwarm.in_rect
+    # viruses come from the broadphase, which is kept up to date through
+    # the tick so it's used here
+    def enemies_in_rect(self, rect: pygame.Rect) -> np.ndarray:
+        return self.enemies.in_rect(rect)
+
+    def viruses_in_rect(self, rect: pygame.Rect) -> list[Virus]:
+        # the spikes stick out past the virus' size
+        return [
+            virus
+            for virus in self._virus_hash.query_rect(rect)
+            if utils.circle_in_rect(virus.position, virus.size * Virus.OUTER_RADIUS, rect)
+        ]
+
+    def _spawn_weapons(self):
+        for weapon in self.weapons.as_list():
+            self._spawn_weapon(weapon.copy())
+
+    def _spawn_weapon(self, weapon: Weapon):
+        chunk = self.world.random_chunk(self.random)
+        weapon.position = chunk.random_pos(self.random)
+        chunk.add_weapon(weapon)
+
+    def _weapon_discard_callback(self, weapon: Weapon):
+        base_weapon = self.weapons.find_equivalent_weapon(weapon)
+        assert base_weapon is not None
+        base_weapon.position = weapon.position
+        self._spawn_weapon(base_weapon.copy())
+
+    def _drop_weapon(self, player: Player):
+        if player.weapon is None:
+            return
+        chunk = self.world.chunk_at(player.position.x, player.position.y)
+        if chunk is not None:
+            chunk.add_weapon(player.weapon.copy())
+        player.weapon = None
+
+    def _spawn_enemies(self, n: int) -> EnemySwarm:
+        enemies = EnemySwarm()
+        w, h = self.world.size()
+        rng = self.random
+        spawned = [
+            (rng.randint(1000, w), rng.randint(1000, h), rng.randint(20, 80), rng.randrange(len(colors)))
+            for _ in range(n)
+        ]
+        if spawned:
+            enemies.spawn(*(np.array(c) for c in zip(*spawned)))
+        return enemies
+
+    def _spawn_viruses(self, n: int) -> list[Virus]:
+        viruses = []
+        w, h = self.world.size()
+        for _ in range(n):
+            xpos = self.random.randint(1000, w)
+            ypos = self.random.randint(1000, h)
+            viruses.append(
+                Virus(
+                    Vector2(xpos, ypos),
+                    self.random.randint(20, 80),
+                )
+            )
+
+        return viruses
+
+    def _rebuild_broadphase(self):
+        self._virus_hash.clear()
+        for virus in self.viruses:
+            self._virus_hash.insert(virus, virus.position, virus.size)
+
+    def _hit_viruses(self, player: Player, blob: Blob):
+        x, y, size = blob.position.x, blob.position.y, blob.size
+        for virus in self._virus_hash.query_circle(blob.position, blob.size):
+            if circles_touch(x, y, size, virus.position.x, virus.position.y, virus.size):
+                player.frames_since_last_virus = 0
+                diff = player.position - virus.position
+                player.speed = diff.normalize() * 20000
+                player._split()
+
+    # the player's blobs eat enemies smaller than them and are eaten by
+    # the rest, enemies move afterwards, see _step_enemies
+    def _collide_enemies(self, player: Player):
+        enemies = self.enemies
+        blobs = list(player.blobs)
+        if not blobs:
+            return
+        eaten_enemies: set[int] = set()
+        eaten_blobs: set[Blob] = set()
+
+        near, touching = enemies.touching(blobs)
+        for blob, row in zip(blobs, touching):
+            self._hit_viruses(player, blob)
+
+            for i in near[row].tolist():
+                if i in eaten_enemies:
+                    continue
+                size = float(enemies.size[i])
+                if size < blob.size:
+                    blob.size = (blob.size**2 + size**2) ** 0.5
+                    eaten_enemies.add(i)
+                    w, h = self.world.size()
+                    rng = self.random
+                    enemies.spawn(
+                        np.array([rng.randint(1000, w)]),
+                        np.array([rng.randint(1000, h)]),
+                        np.array([rng.randint(int(player.size // 2), int(player.size * 1.5))]),
+                        np.array([rng.randrange(len(colors))]),
+                    )
+                else:
+                    enemies.eat_blob(i, blob.size)
+                    eaten_blobs.add(blob)
+                break
+
+        if eaten_enemies:
+            enemies.remove(list(eaten_enemies))
+        player.blobs = [b for b in player.blobs if b not in eaten_blobs]
+
+    def _player_vs_player_eat(self):
+        for i, p1 in enumerate(self.players):
+            for p2 in self.players[i + 1:]:
+                self._players_eat(p1, p2)
+
+    def _players_eat(self, p1: Player, p2: Player):
+        blobs1 = p1.blobs
+        blobs2 = p2.blobs
+        if not blobs1 or not blobs2:
+            return
+
+        eaten1: set[Blob] = set()
+        eaten2: set[Blob] = set()
+        # a player has at most a few dozen blobs so every pair is compared
+        first, second = many_vs_many(*circles_of(blobs1), *circles_of(blobs2), strict=True)
+        for i, j in zip(first.tolist(), second.tolist()):
+            b1 = blobs1[i]
+            b2 = blobs2[j]
+            if b1.size > b2.size:
+                b1.size = (b1.size**2 + b2.size**2) ** 0.5
+                eaten2.add(b2)
+            elif b2.size > b1.size:
+                b2.size = (b2.size**2 + b1.size**2) ** 0.5
+                eaten1.add(b1)
+        p1.blobs = [b for b in blobs1 if b not in eaten1]
+        p2.blobs = [b for b in blobs2 if b not in eaten2]
+
+
+# the inputs of every tick of a game, since the simulation is deterministic
+# this and how the simulation was built is all that's needed to play it
+# back exactly
+class Replay:
+    def __init__(self, kind: type[Simulation], options: dict[str, Any]) -> None:
+        # the simulation's class, ex ShardedSimulation, and its Simulation.options
+        self.kind = kind
+        self.options = options
+        self.inputs: list[list[PlayerInput]] = []
+
+    @staticmethod
+    def of(sim: Simulation) -> "Replay":
+        return Replay(type(sim), dict(sim.options, n_players=len(sim.players)))
+
+    def record(self, inputs: list[PlayerInput]):
+        self.inputs.append(inputs)
+
+    # a sharded replay is left running, close it when done with it
+    def play(self) -> Simulation:
+        sim = self.kind(**self.options)
+        for inputs in self.inputs:
+            sim.step(inputs)
+        return sim
+
+
+# steps the simulation with idle players as fast as possible and reports
+# how many ticks per second it managed, tests/ checks replays match
+def main():
+    ticks = 1000
+    sim = Simulation()
+    idle = [PlayerInput() for _ in sim.players]
+    start = time.perf_counter()
+    for _ in range(ticks):
+        sim.step(idle)
+        if sim.game_over:
+            break
+    elapsed = time.perf_counter() - start
+    print(f"{sim.tick} ticks in {elapsed:.2f}s ({sim.tick / elapsed:.0f} ticks/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+import struct
+from typing import Hashable, Optional
+
+from simulation import Simulation
+from player import Player
+from world import Chunk
+
+# the binary state the server sends each client, see server.py
+#
+# a client is only told about what's in the chunks around it, and only
+# about what changed since the last snapshot it said it got (its baseline)
+# so most entities cost nothing most ticks
+#
+# layout, little endian:
+#   header: type, tick, baseline tick (0 means none), last input used
+#   for blobs, enemies then viruses:
+#     removed count, ids
+#     changed count, then for each: id, flags, the fields flags says follow
+#   food: removed chunk count, chunk indices, changed chunk count, then
+#     for each: chunk index, food count, then each food's x, y (relative to
+#     the chunk), radius and color
+#
+# positions and sizes are fixed point with POSITION_SCALE steps per world
+# unit, small moves are sent as a byte per axis rather than the full value
+
+MSG_SNAPSHOT = 4
+
+POSITION_SCALE = 8
+SIZE_SCALE = 8
+# food positions are relative to their chunk, int16 in 1/FOOD_SCALE units
+FOOD_SCALE = 16
+# chunks this many cells around a player are sent to them
+INTEREST_RADIUS = 1
+
+HEADER = struct.Struct("<BIII")
+COUNT = struct.Struct("<H")
+ID = struct.Struct("<I")
+FLAGS = struct.Struct("<B")
+POSITION = struct.Struct("<ii")
+POSITION_DELTA = struct.Struct("<bb")
+SIZE = struct.Struct("<I")
+SIZE_DELTA = struct.Struct("<b")
+OWNER = struct.Struct("<I")
+CHUNK = struct.Struct("<HH")
+FOOD = struct.Struct("<hhBB")
+
+NEW_POSITION = 1
+MOVED = 2
+NEW_SIZE = 4
+RESIZED = 8
+HAS_OWNER = 16
+
+BLOBS = 0
+ENEMIES = 1
+VIRUSES = 2
+KINDS = (BLOBS, ENEMIES, VIRUSES)
+
+# quantized (x, y, size, owner), owner is 0 for anything but blobs
+Entity = tuple[int, int, int, int]
+
+
+# hands out ids that stay the same for as long as an entity exists
+# shared by every client's encoder so they all agree
+class EntityIds:
+    def __init__(self) -> None:
+        self._ids: dict[Hashable, int] = {}
+        self._next = 1
+
+    def id_of(self, entity: Hashable) -> int:
+        id = self._ids.get(entity)
+        if id is None:
+            id = self._ids[entity] = self._next
+            self._next += 1
+        return id
+
+    # forgets everything not in alive, so the dict doesn't grow forever
+    def prune(self, alive: set):
+        self._ids = {e: id for e, id in self._ids.items() if e in alive}
+
+
+# what one client knows about the world as of `tick`
+class Snapshot:
+    def __init__(self, tick: int = 0, ack: int = 0) -> None:
+        self.tick = tick
+        # the last of this client's inputs the server had used
+        self.ack = ack
+        # entities[kind][id]
+        self.entities: list[dict[int, Entity]] = [{} for _ in KINDS]
+        # chunk index -> that chunk's food as quantized (x, y, radius, color)
+        self.food: dict[int, list[tuple[int, int, int, int]]] = {}
+
+    def copy(self, tick: int, ack: int) -> "Snapshot":
+        snapshot = Snapshot(tick, ack)
+        snapshot.entities = [dict(entities) for entities in self.entities]
+        snapshot.food = dict(self.food)
+        return snapshot
+
+    # (owner id, x, y, size) in world units
+    def blobs(self) -> list[tuple[int, float, float, float]]:
+        return [
+            (owner, x / POSITION_SCALE, y / POSITION_SCALE, size / SIZE_SCALE)
+            for x, y, size, owner in self.entities[BLOBS].values()
+        ]
+
+    # (x, y, size) in world units
+    def enemies(self) -> list[tuple[float, float, float]]:
+        return self._circles(ENEMIES)
+
+    def viruses(self) -> list[tuple[float, float, float]]:
+        return self._circles(VIRUSES)
+
+    def _circles(self, kind: int) -> list[tuple[float, float, float]]:
+        return [
+            (x / POSITION_SCALE, y / POSITION_SCALE, size / SIZE_SCALE)
+            for x, y, size, _ in self.entities[kind].values()
+        ]
+
+    # (x, y, radius, color index) in world units, for every chunk sent
+    def all_food(self, chunks_per_axis: int) -> list[tuple[float, float, int, int]]:
+        food = []
+        for index, items in self.food.items():
+            left, top = _chunk_origin(index, chunks_per_axis)
+            for x, y, radius, color in items:
+                food.append((left + x / FOOD_SCALE, top + y / FOOD_SCALE, radius, color))
+        return food
+
+
+# the chunks around a player that they get told about
+def interest_chunks(sim: Simulation, player: Player) -> list[Chunk]:
+    return sim.world.chunks_around(player.position, INTEREST_RADIUS, INTEREST_RADIUS)
+
+
+# one per client on the server, remembers what it sent so it can send
+# just the differences from whatever the client last acknowledged
+class SnapshotEncoder:
+    # snapshots kept waiting for an ack, an ack older than these gets a
+    # full snapshot instead
+    HISTORY = 64
+
+    def __init__(self, ids: EntityIds) -> None:
+        self._ids = ids
+        self._sent: dict[int, Snapshot] = {}
+        self._acked = 0
+        # chunk index -> ((store, version), quantized food) as last sent
+        self._food: dict[int, tuple[tuple[int, int], list[tuple[int, int, int, int]]]] = {}
+        self._chunk_index: dict[Chunk, int] = {}
+
+    # the client has `tick`, so later snapshots can be sent against it
+    def ack(self, tick: int):
+        if tick <= self._acked or tick not in self._sent:
+            return
+        self._acked = tick
+        for old in [t for t in self._sent if t < tick]:
+            del self._sent[old]
+
+    def encode(self, sim: Simulation, player: Player, player_ids: dict[Player, int], ack: int) -> bytes:
+        base = self._sent.get(self._acked)
+        if base is None:
+            base = Snapshot()
+        current = self._capture(sim, player, player_ids, ack)
+
+        parts = [HEADER.pack(MSG_SNAPSHOT, current.tick, base.tick, ack)]
+        for kind in KINDS:
+            old = base.entities[kind]
+            new = current.entities[kind]
+            removed = [id for id in old if id not in new]
+            parts.append(COUNT.pack(len(removed)))
+            parts.extend(ID.pack(id) for id in removed)
+
+            changed = [(id, e) for id, e in new.items() if old.get(id) != e]
+            parts.append(COUNT.pack(len(changed)))
+            for id, entity in changed:
+                parts.append(_encode_entity(id, old.get(id), entity))
+
+        removed_chunks = [i for i in base.food if i not in current.food]
+        parts.append(COUNT.pack(len(removed_chunks)))
+        parts.extend(COUNT.pack(i) for i in removed_chunks)
+        changed_chunks = [i for i, food in current.food.items() if base.food.get(i) is not food]
+        parts.append(COUNT.pack(len(changed_chunks)))
+        for i in changed_chunks:
+            food = current.food[i]
+            parts.append(CHUNK.pack(i, len(food)))
+            parts.extend(FOOD.pack(*item) for item in food)
+
+        self._sent[current.tick] = current
+        if len(self._sent) > self.HISTORY:
+            del self._sent[min(self._sent)]
+        return b"".join(parts)
+
+    def _capture(self, sim: Simulation, player: Player, player_ids: dict[Player, int], ack: int) -> Snapshot:
+        snapshot = Snapshot(sim.tick, ack)
+        chunks = interest_chunks(sim, player)
+        area = chunks[0].rect().unionall([chunk.rect() for chunk in chunks[1:]])
+        id_of = self._ids.id_of
+
+        blobs = snapshot.entities[BLOBS]
+        for other in sim.players:
+            owner = player_ids.get(other, 0)
+            for blob in other.blobs:
+                if other is player or area.collidepoint(blob.position):
+                    blobs[id_of(blob)] = _quantize(blob.position, blob.size, owner)
+        # enemies already have ids of their own, see EnemySwarm
+        enemies = sim.enemies
+        near = sim.enemies_in_rect(area)
+        x = (enemies.x[near] * POSITION_SCALE).round().astype(int).tolist()
+        y = (enemies.y[near] * POSITION_SCALE).round().astype(int).tolist()
+        size = (enemies.size[near] * SIZE_SCALE).round().astype(int).tolist()
+        snapshot.entities[ENEMIES] = dict(zip(enemies.ids[near].tolist(), zip(x, y, size, [0] * len(x))))
+        viruses = snapshot.entities[VIRUSES]
+        for virus in sim.viruses_in_rect(area):
+            viruses[id_of(virus)] = _quantize(virus.position, virus.size, 0)
+
+        # food is sent a whole chunk at a time, chunks that haven't changed
+        # reuse the same list so encode() can compare them by identity
+        if not self._chunk_index:
+            self._chunk_index = {chunk: i for i, chunk in enumerate(sim.world.chunks)}
+        for chunk in chunks:
+            i = self._chunk_index[chunk]
+            version = (id(chunk.food), chunk.food.version)
+            cached = self._food.get(i)
+            if cached is None or cached[0] != version:
+                cached = self._food[i] = (version, _quantize_food(chunk))
+            snapshot.food[i] = cached[1]
+        return snapshot
+
+
+def _quantize(position, size: float, owner: int) -> Entity:
+    return (
+        round(position.x * POSITION_SCALE),
+        round(position.y * POSITION_SCALE),
+        round(size * SIZE_SCALE),
+        owner,
+    )
+
+
+def _quantize_food(chunk: Chunk) -> list[tuple[int, int, int, int]]:
+    store = chunk.food
+    n = store.count
+    x = ((store.x[:n] - chunk.position.x) * FOOD_SCALE).round().clip(-32768, 32767).astype(int).tolist()
+    y = ((store.y[:n] - chunk.position.y) * FOOD_SCALE).round().clip(-32768, 32767).astype(int).tolist()
+    return list(zip(x, y, store.radius[:n].tolist(), store.color[:n].tolist()))
+
+
+def _encode_entity(id: int, old: Optional[Entity], new: Entity) -> bytes:
+    x, y, size, owner = new
+    flags = 0
+    fields = []
+    if old is None or old[:2] != new[:2]:
+        dx = x - old[0] if old is not None else 0
+        dy = y - old[1] if old is not None else 0
+        if old is not None and -128 <= dx <= 127 and -128 <= dy <= 127:
+            flags |= MOVED
+            fields.append(POSITION_DELTA.pack(dx, dy))
+        else:
+            flags |= NEW_POSITION
+            fields.append(POSITION.pack(x, y))
+    if old is None or old[2] != size:
+        ds = size - old[2] if old is not None else 0
+        if old is not None and -128 <= ds <= 127:
+            flags |= RESIZED
+            fields.append(SIZE_DELTA.pack(ds))
+        else:
+            flags |= NEW_SIZE
+            fields.append(SIZE.pack(size))
+    if owner and (old is None or old[3] != owner):
+        flags |= HAS_OWNER
+        fields.append(OWNER.pack(owner))
+    return ID.pack(id) + FLAGS.pack(flags) + b"".join(fields)
+
+
+def _chunk_origin(index: int, chunks_per_axis: int) -> tuple[int, int]:
+    # World.chunks is built column by column
+    return (index // chunks_per_axis) * Chunk.CHUNK_SIZE, (index % chunks_per_axis) * Chunk.CHUNK_SIZE
+
+
+# one per client, rebuilds the full picture from each delta and the
+# snapshot it was made against
+class SnapshotDecoder:
+    HISTORY = SnapshotEncoder.HISTORY
+
+    def __init__(self) -> None:
+        self._snapshots: dict[int, Snapshot] = {}
+        # newest tick received, what the client should ack
+        self.last_tick = 0
+
+    def decode(self, data: bytes) -> Snapshot:
+        _, tick, baseline, ack = HEADER.unpack_from(data)
+        # tick 0 is the empty snapshot full snapshots are made against
+        base = self._snapshots.get(baseline) if baseline != 0 else Snapshot()
+        if base is None:
+            raise ValueError(f"Snapshot {tick} is against {baseline} which is no longer kept")
+        snapshot = base.copy(tick, ack)
+        offset = HEADER.size
+
+        for kind in KINDS:
+            entities = snapshot.entities[kind]
+            (n,) = COUNT.unpack_from(data, offset)
+            offset += COUNT.size
+            for _ in range(n):
+                (id,) = ID.unpack_from(data, offset)
+                offset += ID.size
+                entities.pop(id, None)
+
+            (n,) = COUNT.unpack_from(data, offset)
+            offset += COUNT.size
+            for _ in range(n):
+                id, entity, offset = _decode_entity(data, offset, entities)
+                entities[id] = entity
+
+        (n,) = COUNT.unpack_from(data, offset)
+        offset += COUNT.size
+        for _ in range(n):
+            (i,) = COUNT.unpack_from(data, offset)
+            offset += COUNT.size
+            snapshot.food.pop(i, None)
+        (n,) = COUNT.unpack_from(data, offset)
+        offset += COUNT.size
+        for _ in range(n):
+            i, count = CHUNK.unpack_from(data, offset)
+            offset += CHUNK.size
+            snapshot.food[i] = [
+                FOOD.unpack_from(data, offset + j * FOOD.size) for j in range(count)
+            ]
+            offset += count * FOOD.size
+
+        self._snapshots[tick] = snapshot
+        self.last_tick = max(self.last_tick, tick)
+        # the server only builds on snapshots at or after the one acked,
+        # anything much older than the newest can go
+        for old in [t for t in self._snapshots if t < self.last_tick - self.HISTORY]:
+            del self._snapshots[old]
+        return snapshot
+
+
+def _decode_entity(data: bytes, offset: int, entities: dict[int, Entity]) -> tuple[int, Entity, int]:
+    (id,) = ID.unpack_from(data, offset)
+    offset += ID.size
+    (flags,) = FLAGS.unpack_from(data, offset)
+    offset += FLAGS.size
+    x, y, size, owner = entities.get(id, (0, 0, 0, 0))
+    if flags & NEW_POSITION:
+        x, y = POSITION.unpack_from(data, offset)
+        offset += POSITION.size
+    elif flags & MOVED:
+        dx, dy = POSITION_DELTA.unpack_from(data, offset)
+        offset += POSITION_DELTA.size
+        x += dx
+        y += dy
+    if flags & NEW_SIZE:
+        (size,) = SIZE.unpack_from(data, offset)
+        offset += SIZE.size
+    elif flags & RESIZED:
+        (ds,) = SIZE_DELTA.unpack_from(data, offset)
+        offset += SIZE_DELTA.size
+        size += ds
+    if flags & HAS_OWNER:
+        (owner,) = OWNER.unpack_from(data, offset)
+        offset += OWNER.size
+    return id, (x, y, size, owner), offset
@@ -0,0 +1,84 @@
+from typing import Generic, Hashable, TypeVar
+
+import pygame
+from pygame import Vector2
+
+T = TypeVar("T", bound=Hashable)
+
+
+# uniform grid broadphase
+# items are stored in every cell their bounding box touches, queries only
+# return candidates so callers still have to do their own narrow phase
+class SpatialHash(Generic[T]):
+    def __init__(self, cell_size: int = 200) -> None:
+        self.cell_size = cell_size
+        self._cells: dict[tuple[int, int], list[T]] = {}
+        # item -> cells it is currently stored in
+        self._item_cells: dict[T, list[tuple[int, int]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._item_cells)
+
+    def __contains__(self, item: T) -> bool:
+        return item in self._item_cells
+
+    def clear(self):
+        self._cells.clear()
+        self._item_cells.clear()
+
+    def insert(self, item: T, pos: Vector2, radius: float):
+        keys = self._cell_keys(pos.x - radius, pos.y - radius, pos.x + radius, pos.y + radius)
+        for key in keys:
+            cell = self._cells.get(key)
+            if cell is None:
+                self._cells[key] = [item]
+            else:
+                cell.append(item)
+        self._item_cells[item] = keys
+
+    def remove(self, item: T):
+        keys = self._item_cells.pop(item, None)
+        if keys is None:
+            return
+        for key in keys:
+            cell = self._cells[key]
+            cell.remove(item)
+            if not cell:
+                del self._cells[key]
+
+    def move(self, item: T, pos: Vector2, radius: float):
+        keys = self._cell_keys(pos.x - radius, pos.y - radius, pos.x + radius, pos.y + radius)
+        # most moves stay inside the same cells
+        if self._item_cells.get(item) == keys:
+            return
+        self.remove(item)
+        self.insert(item, pos, radius)
+
+    # returns every item sharing a cell with the circle's bounding box
+    def query_circle(self, pos: Vector2, radius: float) -> list[T]:
+        return self._query(pos.x - radius, pos.y - radius, pos.x + radius, pos.y + radius)
+
+    def query_rect(self, rect: pygame.Rect) -> list[T]:
+        return self._query(rect.left, rect.top, rect.right, rect.bottom)
+
+    def _query(self, min_x: float, min_y: float, max_x: float, max_y: float) -> list[T]:
+        keys = self._cell_keys(min_x, min_y, max_x, max_y)
+        if len(keys) == 1:
+            return list(self._cells.get(keys[0], ()))
+
+        found: list[T] = []
+        seen: set[T] = set()
+        for key in keys:
+            for item in self._cells.get(key, ()):
+                if item not in seen:
+                    seen.add(item)
+                    found.append(item)
+        return found
+
+    def _cell_keys(
+        self, min_x: float, min_y: float, max_x: float, max_y: float
+    ) -> list[tuple[int, int]]:
+        size = self.cell_size
+        x0, x1 = int(min_x // size), int(max_x // size)
+        y0, y1 = int(min_y // size), int(max_y // size)
+        return [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
@@ -0,0 +1,68 @@
+import math
+from typing import Callable, Hashable, Optional
+
+import pygame
+from pygame import Color, Surface, Vector2
+
+import utils
+
+# draws a shape centred on the given point with the given radius
+DrawShape = Callable[[Surface, Vector2, float], None]
+
+
+# pre-drawn sprites for shapes that only depend on their on screen radius,
+# blitting one is much cheaper than redrawing the shape every frame
+# sprites are keyed by whole pixel radius and the whole cache is dropped
+# when the zoom moves to another step, since by then most of the radii
+# in it won't be seen again
+class SpriteCache:
+    ZOOM_STEP = 0.05
+    CAPACITY = 512
+    # bigger shapes are drawn directly, a sprite that size uses more
+    # memory than it saves and there are only ever a few on screen
+    MAX_RADIUS = 200
+    # never one of the game's colors, see food.colors
+    TRANSPARENT = Color(255, 0, 255)
+
+    def __init__(self) -> None:
+        self._zoom_step: Optional[int] = None
+        self._sprites: utils.LRUCache[tuple, Surface] = utils.LRUCache(self.CAPACITY)
+
+    def __len__(self) -> int:
+        return len(self._sprites)
+
+    def clear(self):
+        self._sprites.clear()
+
+    # `key` identifies the shape, ex its kind and color
+    # `extent` is how far the shape reaches past its radius
+    def draw(
+        self,
+        screen: Surface,
+        zoom: float,
+        key: Hashable,
+        center: Vector2,
+        radius: float,
+        draw_shape: DrawShape,
+        extent: float = 1,
+    ):
+        zoom_step = round(zoom / self.ZOOM_STEP)
+        if zoom_step != self._zoom_step:
+            self._zoom_step = zoom_step
+            self._sprites.clear()
+
+        r = round(radius)
+        if r < 1 or r > self.MAX_RADIUS:
+            draw_shape(screen, center, radius)
+            return
+
+        half = math.ceil(r * extent) + 1
+        sprite = self._sprites.get((key, r))
+        if sprite is None:
+            sprite = Surface((half * 2, half * 2))
+            sprite.fill(self.TRANSPARENT)
+            draw_shape(sprite, Vector2(half, half), r)
+            # colorkeyed and run length encoded blits faster than per pixel alpha
+            sprite.set_colorkey(self.TRANSPARENT, pygame.RLEACCEL)
+            self._sprites.put((key, r), sprite)
+        screen.blit(sprite, (center.x - half, center.y - half))
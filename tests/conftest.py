@@ -0,0 +1,15 @@
+import os
+from pathlib import Path
+
+import pytest
+
+# the simulation loads textures but never opens a window
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+# textures are loaded relative to the repository root, like the game does
+@pytest.fixture(autouse=True)
+def run_from_root(monkeypatch):
+    monkeypatch.chdir(ROOT)
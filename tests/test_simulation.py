@@ -0,0 +1,87 @@
+import random
+
+import pytest
+from pygame import Vector2
+
+from player import PlayerInput
+from sharding import ShardedSimulation
+from simulation import Replay, Simulation
+
+TICKS = 120
+OPTIONS = dict(n_players=3, tick_rate=30, seed=7, n_enemies=200, n_viruses=5, chunks_per_axis=8)
+
+
+# everyone heads off in their own direction and splits now and then
+def inputs(sim: Simulation) -> list[PlayerInput]:
+    return [
+        PlayerInput(Vector2(1, 0).rotate(120 * i + sim.tick), split=sim.tick % 40 == 0)
+        for i in range(len(sim.players))
+    ]
+
+
+def play(sim: Simulation, ticks: int = TICKS) -> Replay:
+    replay = Replay.of(sim)
+    for _ in range(ticks):
+        step = inputs(sim)
+        sim.step(step)
+        replay.record(step)
+    return replay
+
+
+def close(sim: Simulation):
+    if isinstance(sim, ShardedSimulation):
+        sim.close()
+
+
+@pytest.mark.parametrize(
+    "kind, options",
+    [
+        (Simulation, {}),
+        (Simulation, dict(food_threads=2)),
+        (Simulation, dict(lod=False)),
+        (ShardedSimulation, dict(shards=2)),
+    ],
+    ids=["serial", "food threads", "no lod", "shards"],
+)
+def test_replay_matches(kind, options):
+    sim = kind(**OPTIONS, **options)
+    replayed = play(sim).play()
+    try:
+        assert type(replayed) is kind
+        assert replayed.options == sim.options
+        assert replayed.tick == sim.tick
+        assert replayed.checksum() == sim.checksum()
+    finally:
+        close(sim)
+        close(replayed)
+
+
+def test_food_threads_match_serial():
+    serial = Simulation(**OPTIONS)
+    threaded = Simulation(**OPTIONS, food_threads=2)
+    play(serial)
+    play(threaded)
+    assert threaded.checksum() == serial.checksum()
+
+
+# the game only depends on its seed, not on whoever else uses random
+def test_global_random_does_not_change_the_game():
+    quiet = Simulation(**OPTIONS)
+    play(quiet)
+
+    noisy = Simulation(**OPTIONS)
+    for _ in range(TICKS):
+        random.seed(random.random())
+        Simulation(1, seed=1, n_enemies=0, n_viruses=0, chunks_per_axis=3)
+        noisy.step(inputs(noisy))
+    assert noisy.checksum() == quiet.checksum()
+
+
+def test_step_after_game_over():
+    sim = Simulation(**OPTIONS)
+    for player in sim.players:
+        player.blobs = []
+    sim.step(inputs(sim))
+    assert sim.game_over
+    sim.step(inputs(sim))
+    assert sim.tick == 2
@@ -0,0 +1,57 @@
+import asyncio
+
+from pygame import Vector2
+
+from network import LoopbackTransport
+from player import PlayerInput
+from simulation import Simulation
+from snapshot import KINDS, EntityIds, SnapshotDecoder, SnapshotEncoder
+
+
+# encodes what one player sees every tick, sends it over a loopback
+# connection and checks the client decodes exactly what was captured
+# acks lag a few ticks so most snapshots are deltas against older ones
+async def round_trip(ticks: int, ack_lag: int):
+    sim = Simulation(2, seed=3, n_enemies=100, chunks_per_axis=6)
+    player = sim.players[0]
+    player_ids = {p: i + 1 for i, p in enumerate(sim.players)}
+    encoder = SnapshotEncoder(EntityIds())
+    decoder = SnapshotDecoder()
+
+    transport = LoopbackTransport()
+    server_ends: asyncio.Queue = asyncio.Queue()
+
+    async def on_connect(connection):
+        await server_ends.put(connection)
+
+    await transport.start(on_connect)
+    client = await transport.connect()
+    server = await server_ends.get()
+
+    for tick in range(ticks):
+        sim.step([PlayerInput(Vector2(1, 0.5 * i)) for i in range(len(sim.players))])
+        server.send(encoder.encode(sim, player, player_ids, tick))
+        data = await client.recv()
+        assert data is not None
+        snapshot = decoder.decode(data)
+
+        sent = encoder._sent[sim.tick]
+        assert snapshot.tick == sim.tick
+        assert snapshot.ack == tick
+        for kind in KINDS:
+            assert snapshot.entities[kind] == sent.entities[kind]
+        assert snapshot.food == sent.food
+        if sim.tick > ack_lag:
+            encoder.ack(sim.tick - ack_lag)
+
+    server.close()
+    assert await client.recv() is None
+    await transport.close()
+
+
+def test_snapshot_round_trip():
+    asyncio.run(round_trip(ticks=90, ack_lag=0))
+
+
+def test_snapshot_round_trip_with_late_acks():
+    asyncio.run(round_trip(ticks=90, ack_lag=5))
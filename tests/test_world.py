@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+from pygame import Vector2
+
+from world import Chunk, World
+
+RESPAWN = World.FOOD_RESPAWN_TIME
+
+
+def new_chunk(offset: int) -> Chunk:
+    return Chunk(Vector2(0, 0), np.random.default_rng(0), offset)
+
+
+# a chunk asleep from `slept_at` until `woken_at` ends up with the food of
+# one updated every tick, whichever tick the respawns land on
+@pytest.mark.parametrize("offset", [0, 1, 29, RESPAWN - 1])
+@pytest.mark.parametrize("asleep", [1, RESPAWN - 1, RESPAWN, RESPAWN + 1, 3 * RESPAWN])
+def test_sleeping_chunk_catches_up_on_food(offset, asleep):
+    for slept_at in range(1, 2 * RESPAWN):
+        woken_at = slept_at + asleep
+        awake = new_chunk(offset)
+        napping = new_chunk(offset)
+        # World.update: time goes up, chunks wake and sleep, then update
+        napping.wake(1)
+        for time in range(1, woken_at + RESPAWN):
+            awake.update([], time)
+            if time == slept_at:
+                napping.sleep(time)
+            if time == woken_at:
+                napping.wake(time)
+            if napping.awake:
+                napping.update([], time)
+        assert napping.food.count == awake.food.count, (slept_at, woken_at)
+
+
+def test_chunk_woken_on_first_tick_has_no_food_to_catch_up_on():
+    chunk = new_chunk(RESPAWN - 1)
+    chunk.wake(1)
+    assert chunk.food.count == 0
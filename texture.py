@@ -2,21 +2,69 @@ from pygame import Vector2
 import pygame
 
 import utils
+from camera import Camera
 
 
 class Texture:
+    # zoom and rotation are rounded to these steps so nearby values
+    # share one cached surface
+    ZOOM_STEP = 0.05
+    ROTATION_STEP = 2
+    CACHE_SIZE = 256
+
+    # shared by every texture, keyed on (texture, scale, zoom step, rotation step)
+    _cache: utils.LRUCache[tuple, pygame.Surface] = utils.LRUCache(CACHE_SIZE)
+
     def __init__(self, path: str) -> None:
-        self.data = pygame.image.load(path).convert_alpha()
+        self.path = path
+        # loaded on first use since convert_alpha needs a display,
+        # which the headless simulation never opens
+        self._data: pygame.Surface | None = None
+        # copy of the image shrunk to the largest size it's ever drawn at
+        self._base: pygame.Surface | None = None
+        self._base_scale = Vector2(0, 0)
         self.rotation: float = 0
-        self.original_size = Vector2(self.data.get_width(), self.data.get_height())
         self.scale = Vector2(1, 1)
 
+    @property
+    def data(self) -> pygame.Surface:
+        if self._data is None:
+            self._data = pygame.image.load(self.path).convert_alpha()
+        return self._data
+
+    @property
+    def original_size(self) -> Vector2:
+        return Vector2(self.data.get_width(), self.data.get_height())
+
     def render(self, screen, pos: Vector2, zoom: float):
-        tex = pygame.transform.scale(
-            self.data,
-            utils.mul_vec(self.original_size, self.scale * zoom),
-        )
-        tex = pygame.transform.rotate(tex, self.rotation)
+        tex = self._transformed(zoom)
         # Get the new rect and center it
         rect = tex.get_rect(center=pos)
         screen.blit(tex, rect.topleft)
+
+    def _transformed(self, zoom: float) -> pygame.Surface:
+        zoom_step = max(round(zoom / self.ZOOM_STEP), 1)
+        steps = 360 // self.ROTATION_STEP
+        rotation_step = round(self.rotation / self.ROTATION_STEP) % steps
+        key = (self, self.scale.x, self.scale.y, zoom_step, rotation_step)
+
+        tex = self._cache.get(key)
+        if tex is None:
+            size = utils.mul_vec(self.original_size, self.scale * zoom_step * self.ZOOM_STEP)
+            tex = pygame.transform.smoothscale(self._base_image(), size)
+            tex = pygame.transform.rotate(tex, rotation_step * self.ROTATION_STEP)
+            self._cache.put(key, tex)
+        return tex
+
+    # the source images are far bigger than they are ever drawn, so
+    # resampling starts from a copy shrunk to the max zoom size
+    def _base_image(self) -> pygame.Surface:
+        if self._base is None or self._base_scale != self.scale:
+            factor = Vector2(
+                min(self.scale.x * Camera.MAX_ZOOM, 1),
+                min(self.scale.y * Camera.MAX_ZOOM, 1),
+            )
+            size = utils.mul_vec(self.original_size, factor)
+            self._base = pygame.transform.smoothscale(self.data, size)
+            self._base_scale = self.scale.copy()
+        return self._base
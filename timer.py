@@ -14,3 +14,31 @@ class Timer:
 
     def elapsed_millis(self) -> float:
         return self.elapsed() * 1000.0
+
+
+# turns variable frame times into a whole number of fixed size ticks
+# leftover time carries over to the next frame and `alpha` says how far
+# into the next tick the frame is, for interpolating when rendering
+class FixedTimestep:
+    def __init__(self, tick_rate: int, max_steps: int = 5) -> None:
+        self.dt = 1.0 / tick_rate
+        # caps how many ticks a single slow frame can trigger so a
+        # long stall doesn't snowball into even longer frames
+        self.max_steps = max_steps
+        self._accumulator = 0.0
+
+    # returns how many ticks to run for a frame that took frame_time seconds
+    def advance(self, frame_time: float) -> int:
+        self._accumulator += frame_time
+        steps = int(self._accumulator // self.dt)
+        if steps > self.max_steps:
+            steps = self.max_steps
+            # drop the time that couldn't be caught up on
+            self._accumulator = self._accumulator % self.dt
+        else:
+            self._accumulator -= steps * self.dt
+        return steps
+
+    @property
+    def alpha(self) -> float:
+        return min(self._accumulator / self.dt, 1.0)
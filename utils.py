@@ -1,6 +1,12 @@
+from collections import OrderedDict
+from typing import Generic, Hashable, Optional, TypeVar
+
 import pygame
 from pygame import Vector2
 
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
 
 class Bounds:
     def __init__(self, top_left: Vector2, w: int, h: int) -> None:
@@ -26,3 +32,38 @@ def mul_vec(vec1: Vector2, vec2: Vector2) -> Vector2:
 def direction_to(p: pygame.Vector2, target: pygame.Vector2) -> pygame.Vector2:
     direction = target - p
     return direction.normalize()
+
+
+# whether the circle's bounding box overlaps rect, good enough for culling
+def circle_in_rect(pos: Vector2, radius: float, rect: pygame.Rect) -> bool:
+    return (
+        pos.x + radius >= rect.left
+        and pos.x - radius <= rect.right
+        and pos.y + radius >= rect.top
+        and pos.y - radius <= rect.bottom
+    )
+
+
+# evicts the least recently used entry once it holds `capacity` entries
+class LRUCache(Generic[K, V]):
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self._entries: OrderedDict[K, V] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: K) -> Optional[V]:
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: K, value: V):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
@@ -0,0 +1,178 @@
+import math
+from typing import Optional
+
+import numpy as np
+import pygame
+
+import utils
+from gamepad_controller import JoystickController
+from hud import Hud
+from player import Player
+from profiler import Profiler
+from simulation import Simulation
+from virus import Virus
+
+# world units, how far past the view enemies are still drawn
+CULL_MARGIN = 16
+
+
+# draws what `player` sees onto surface
+# alpha is how far between the last two ticks to draw
+# draw calls are counted under "<view> draws", and summed over every view
+# under "draws" and "food draws"
+# enemies (as indices into sim.enemies) and viruses can be given if they've
+# already been culled to an area covering this view, otherwise they're
+# looked up here
+def render_view(
+    sim: Simulation,
+    surface: pygame.Surface,
+    player: Player,
+    alpha: float,
+    profiler: Profiler,
+    view: str = "view",
+    enemies: Optional[np.ndarray] = None,
+    viruses: Optional[list[Virus]] = None,
+):
+    player.camera.target = player.render_position(alpha)
+    # only what overlaps this rect gets drawn
+    visible = player.camera.view_rect(surface)
+    # enemies are drawn where they were up to a tick ago
+    near_visible = visible.inflate(2 * CULL_MARGIN, 2 * CULL_MARGIN)
+    draws = 0
+
+    world = sim.world
+    with profiler.phase("render food"):
+        food_draws = world.render_food(surface, player)
+        draws += food_draws
+    with profiler.phase("render weapons"):
+        draws += world.render_weapons(surface, player)
+
+    with profiler.phase("render enemies"):
+        if enemies is None:
+            enemies = sim.enemies_in_rect(near_visible)
+        else:
+            enemies = sim.enemies.in_rect(near_visible, enemies)
+        draws += sim.enemies.render(surface, player.camera, alpha, enemies)
+
+    with profiler.phase("render viruses"):
+        if viruses is None:
+            viruses = sim.viruses_in_rect(visible)
+        else:
+            viruses = [
+                v for v in viruses
+                if utils.circle_in_rect(v.position, v.size * Virus.OUTER_RADIUS, visible)
+            ]
+        for virus in viruses:
+            virus.render(surface, player.camera)
+        draws += len(viruses)
+
+    with profiler.phase("render players"):
+        player.render(surface, alpha)
+        draws += len(player.blobs)
+
+    profiler.count(f"{view} draws", draws)
+    profiler.count("food draws", food_draws)
+    profiler.count("draws", draws)
+
+
+# one local player's part of the screen
+class Viewport:
+    def __init__(self, name: str, surface: pygame.Surface, player: Player, hud_side: str) -> None:
+        self.name = name
+        self.surface = surface
+        self.player = player
+        self.hud = Hud(surface)
+        self.hud_side = hud_side
+
+
+# tiles the screen between up to MAX_PLAYERS local players, every view is
+# drawn from the same simulation state
+class ViewportManager:
+    MAX_PLAYERS = 8
+    DIVIDER_WIDTH = 4
+
+    def __init__(self, screen: pygame.Surface, players: list[Player]) -> None:
+        if not 1 <= len(players) <= self.MAX_PLAYERS:
+            raise ValueError(f"Can only split the screen between 1 and {self.MAX_PLAYERS} players")
+
+        self.screen = screen
+        self.columns, self.rows = self.grid(len(players))
+        self.viewports: list[Viewport] = []
+        for i, player in enumerate(players):
+            rect = self._tile_rect(i)
+            side = "right" if rect.centerx > screen.get_width() // 2 else "left"
+            self.viewports.append(
+                Viewport(f"view {i + 1}", screen.subsurface(rect), player, side)
+            )
+
+    # (columns, rows) for n views, one row for up to 2 and two rows after
+    # that, so views stay as wide as possible on a screen wider than tall
+    @staticmethod
+    def grid(n: int) -> tuple[int, int]:
+        if n <= 2:
+            return n, 1
+        rows = 2
+        return math.ceil(n / rows), rows
+
+    def _tile_rect(self, i: int) -> pygame.Rect:
+        w = self.screen.get_width() // self.columns
+        h = self.screen.get_height() // self.rows
+        column, row = i % self.columns, i // self.columns
+        return pygame.Rect(column * w, row * h, w, h)
+
+    def render(self, sim: Simulation, alpha: float, profiler: Profiler):
+        # views looking at overlapping parts of the world share one lookup
+        # of the enemies and viruses there
+        for viewport in self.viewports:
+            viewport.player.camera.target = viewport.player.render_position(alpha)
+        for area, members in self._overlapping_views():
+            enemies = sim.enemies_in_rect(area)
+            viruses = sim.viruses_in_rect(area)
+            for viewport in members:
+                render_view(
+                    sim,
+                    viewport.surface,
+                    viewport.player,
+                    alpha,
+                    profiler,
+                    viewport.name,
+                    enemies,
+                    viruses,
+                )
+
+    # groups the views whose world rects overlap, with the area covering them
+    def _overlapping_views(self) -> list[tuple[pygame.Rect, list[Viewport]]]:
+        groups: list[tuple[pygame.Rect, list[Viewport]]] = []
+        for viewport in self.viewports:
+            area = viewport.player.camera.view_rect(viewport.surface)
+            area.inflate_ip(2 * CULL_MARGIN, 2 * CULL_MARGIN)
+            members = [viewport]
+            # merging can make a group overlap ones it didn't before
+            merged = True
+            while merged:
+                merged = False
+                for group in groups:
+                    if group[0].colliderect(area):
+                        groups.remove(group)
+                        area = area.union(group[0])
+                        members = group[1] + members
+                        merged = True
+                        break
+            groups.append((area, members))
+        return groups
+
+    # controllers[i] is the controller of the i-th view's player, if any
+    def render_huds(self, controllers: list[Optional[JoystickController]]):
+        for viewport, controller in zip(self.viewports, controllers):
+            viewport.hud.render(viewport.player, controller, side=viewport.hud_side)
+
+    def render_dividers(self):
+        w = self.screen.get_width()
+        h = self.screen.get_height()
+        half = self.DIVIDER_WIDTH // 2
+        for column in range(1, self.columns):
+            x = column * w // self.columns
+            pygame.draw.rect(self.screen, (0, 0, 0), (x - half, 0, self.DIVIDER_WIDTH, h))
+        for row in range(1, self.rows):
+            y = row * h // self.rows
+            pygame.draw.rect(self.screen, (0, 0, 0), (0, y - half, w, self.DIVIDER_WIDTH))
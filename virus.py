@@ -1,7 +1,5 @@
 from pygame import Vector2, Color
-from collision_circle import CollisionCircle
 import pygame
-from food import Food
 from player import Blob
 import math
 
@@ -9,23 +7,36 @@ from camera import Camera
 
 
 class Virus:
+    # Spiky shape parameters
+    NUM_SPIKES = 12
+    INNER_RADIUS = 0.7
+    OUTER_RADIUS = 1.3
+    __slots__ = ("position", "size")
+
     def __init__(self, pos: Vector2, size: int) -> None:
         self.position = pos
         self.size = size
 
     def render(self, screen, camera: Camera):
-        screen_pos = camera.to_screen_pos(screen, self.position)
-        center_x, center_y = screen_pos
-        radius = self.size * camera.zoom
-
-        # Spiky shape parameters
-        num_spikes = 12
-        inner_radius = radius * 0.7
-        outer_radius = radius * 1.3
+        camera.sprites.draw(
+            screen,
+            camera.zoom,
+            "virus",
+            camera.to_screen_pos(screen, self.position),
+            self.size * camera.zoom,
+            self._draw_shape,
+            self.OUTER_RADIUS,
+        )
+
+    @classmethod
+    def _draw_shape(cls, screen, center: Vector2, radius: float):
+        center_x, center_y = center
+        inner_radius = radius * cls.INNER_RADIUS
+        outer_radius = radius * cls.OUTER_RADIUS
 
         points = []
-        for i in range(num_spikes * 2):
-            angle = math.pi * i / num_spikes
+        for i in range(cls.NUM_SPIKES * 2):
+            angle = math.pi * i / cls.NUM_SPIKES
             r = outer_radius if i % 2 == 0 else inner_radius
             x = center_x + math.cos(angle) * r
             y = center_y + math.sin(angle) * r
@@ -35,7 +46,4 @@ class Virus:
         pygame.draw.polygon(screen, Color(0, 255, 0), points)
 
         # Optional: draw central circle on top
-        pygame.draw.circle(screen, Color(0, 180, 0), screen_pos, inner_radius)
-
-    def collision_circle(self) -> CollisionCircle:
-        return CollisionCircle(self.position.copy(), self.size)
+        pygame.draw.circle(screen, Color(0, 180, 0), center, inner_radius)
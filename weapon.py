@@ -4,11 +4,8 @@ from pygame import Vector2
 
 from pygame import Color
 from camera import Camera
-from collision_circle import CollisionCircle
 import utils
 from texture import Texture
-from timer import Timer
-from typing import Optional
 
 
 class Effect(Enum):
@@ -31,27 +28,66 @@ class Effect(Enum):
         return 0.5
 
 
+BULLET_COLOR = Color(252, 186, 3)
+
+
 class Bullet:
+    __slots__ = ("radius", "position", "prev_position", "velocity", "color")
+
     def __init__(self, pos: Vector2, vel: Vector2, color: Color, radius):
         self.radius = radius
         self.position = pos
+        self.prev_position = pos.copy()
         self.velocity = vel
         
         self.color = color
 
+    # puts a bullet from BulletPool back into play
+    def reset(self, x: float, y: float, vx: float, vy: float, radius):
+        self.radius = radius
+        self.position.update(x, y)
+        self.prev_position.update(x, y)
+        self.velocity.update(vx, vy)
+
     def update(self, dt: float):
-        self.position += self.velocity * dt
+        self.prev_position.update(self.position)
+        self.position.x += self.velocity.x * dt
+        self.position.y += self.velocity.y * dt
 
-    def render(self, screen, camera: Camera):
+    def render(self, screen, camera: Camera, alpha: float = 1):
         pygame.draw.circle(
             screen,
             self.color,
-            camera.to_screen_pos(screen, self.position),
+            camera.to_screen_pos(screen, self.prev_position.lerp(self.position, alpha)),
             self.radius,
         )
 
-    def collision_circle(self) -> CollisionCircle:
-        return CollisionCircle(self.position, self.radius)
+
+# bullets that were deleted, handed out again for new shots instead of
+# making a Bullet and its vectors every time one is fired
+# a bullet given back must not be used by whoever gave it back
+class BulletPool:
+    # past this many spare bullets the rest are left to the gc
+    MAX_FREE = 1024
+
+    def __init__(self) -> None:
+        self._free: list[Bullet] = []
+        # off makes every shot a new Bullet, see benchmarks/allocations.py
+        self.enabled = True
+
+    def acquire(self, x: float, y: float, vx: float, vy: float, radius) -> Bullet:
+        if self._free and self.enabled:
+            bullet = self._free.pop()
+            bullet.reset(x, y, vx, vy, radius)
+            return bullet
+        return Bullet(Vector2(x, y), Vector2(vx, vy), BULLET_COLOR, radius)
+
+    def release(self, bullet: Bullet):
+        if self.enabled and len(self._free) < self.MAX_FREE:
+            self._free.append(bullet)
+
+
+bullet_pool = BulletPool()
 
 
 class Weapon:
@@ -72,8 +108,8 @@ class Weapon:
         self.bullets: list[Bullet] = []
         self.bullet_speed = 800
         self.ammo = ammo
-        self._timer = Timer()
-        self._first_shot = True
+        # ticks until the next bullet can be fired
+        self._cooldown = 0
         self.radius: int = 5
     def look_at(
         self,
@@ -85,67 +121,60 @@ class Weapon:
         direction = target_position - pos
         self.texture.rotation = direction.angle_to(pygame.Vector2(1, 0))
 
-    def render(self, screen, camera: Camera):
+    def render(self, screen, camera: Camera, alpha: float = 1):
         self.texture.render(
             screen,
             camera.to_screen_pos(screen, self.position),
             camera.zoom,
         )
 
+        view = camera.view_rect(screen)
         for bullet in self.bullets:
-            bullet.render(screen, camera)
+            # bullets are the same size on screen at any zoom
+            if utils.circle_in_rect(bullet.position, bullet.radius / camera.zoom, view):
+                bullet.render(screen, camera, alpha)
 
     # if any bullet is not inside the bounds rect then
     # that bullet gets deleted
     def update(self, bounds: utils.Bounds, dt: float):
-        bullets_to_remove: list[int] = []
-        for i, bullet in enumerate(self.bullets):
+        # the bullets kept are packed to the front of the list in place
+        bullets = self.bullets
+        kept = 0
+        for bullet in bullets:
             if not bounds.contains(bullet.position):
-                bullets_to_remove.append(i)
+                bullet_pool.release(bullet)
                 continue
 
             bullet.update(dt)
-
-        # go in reverse order to avoid skipping over elements
-        for i in sorted(bullets_to_remove, reverse=True):
-            self.delete_bullet(i)
-
-    def spawn_bullet(self, dir: Vector2):
-        if self.ammo <= 0:
+            bullets[kept] = bullet
+            kept += 1
+        del bullets[kept:]
+
+    # counts the cooldown down a tick, call before spawn_bullet so a shot
+    # can land on the tick the cooldown ends
+    def cool_down(self):
+        if self._cooldown > 0:
+            self._cooldown -= 1
+
+    def spawn_bullet(self, dir: Vector2, dt: float):
+        if self.ammo <= 0 or self._cooldown > 0:
             return
 
-        time_threshold = 1.0 / self.fire_rate
-        if self._timer.elapsed() > time_threshold or self._first_shot:
-            self._first_shot = False
-            self._timer.reset()
-        else:
-            return
+        self._cooldown = max(1, round(1.0 / (self.fire_rate * dt)))
 
         self.ammo -= 1
         self.bullets.append(
-            Bullet(
-                self.position.copy(),
-                self.bullet_speed * dir,
-                Color(252, 186, 3),
-                self.radius
+            bullet_pool.acquire(
+                self.position.x,
+                self.position.y,
+                self.bullet_speed * dir.x,
+                self.bullet_speed * dir.y,
+                self.radius,
             )
         )
 
-    # returns an index of the first enemy that bullet collides with
-    # also deletes the bullet that collides with that enemy
-    def check_collision(
-        self,
-        collision_circles: list[CollisionCircle],
-    ) -> Optional[int]:
-        for i, cc in enumerate(collision_circles):
-            for j, bullet in enumerate(self.bullets):
-                if bullet.collision_circle().is_colliding_with(cc):
-                    self.delete_bullet(j)
-                    return i
-        return None
-
     def delete_bullet(self, i: int):
-        del self.bullets[i]
+        bullet_pool.release(self.bullets.pop(i))
 
     def copy(self) -> "Weapon":
         new = Weapon(
@@ -158,8 +187,4 @@ class Weapon:
         new.radius = self.radius
         new.bullet_speed = self.bullet_speed
         return new
-
-    # used for pick ups
-    def collision_circle(self) -> CollisionCircle:
-        return CollisionCircle(self.position.copy(), self.PICKUP_RADIUS)
     
\ No newline at end of file
@@ -1,27 +1,18 @@
 import random
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
 
+import numpy as np
 import pygame
-from food import Food
-from hud import Hud
+from food import FoodLayer, FoodStore, resolve_food
 from player import Player
 from camera import Camera
-from pygame import Vector2, Color
-from utils import Bounds
+from collision import circle_vs_many, circles_of
+from pygame import Vector2
+from utils import Bounds, LRUCache, circle_in_rect
 from weapon import Weapon
-from enemy import Enemy
-
-colors = [
-    Color(255, 0, 0),  # red
-    Color(0, 255, 0),  # green
-    Color(0, 0, 255),  # blue
-    Color(255, 255, 0),  # yellow
-    Color(128, 0, 128),  # purple
-    Color(255, 165, 0),  # orange
-    Color(165, 42, 42),  # brown
-    Color(255, 192, 203),  # pink
-    Color(0, 255, 255),  # cyan
-]
-
+from enemy import EnemySwarm
+from lod import LodScheduler
 
 class Chunk:
     MAX_FOOD_PER_CHUNK = 100
@@ -30,213 +21,285 @@ class Chunk:
 
     CHUNK_SIZE = 1000
 
-    def __init__(self, position: Vector2, player: Player) -> None:
+    def __init__(
+        self,
+        position: Vector2,
+        rng: Optional[np.random.Generator] = None,
+        respawn_offset: int = 0,
+    ) -> None:
         # top left corner
         self.position = position
         self.width = self.CHUNK_SIZE
         self.height = self.CHUNK_SIZE
-        self.food: list[Food] = []
-        self._player = player
+        self.food = FoodStore(self.MAX_FOOD_PER_CHUNK, rng)
         self._weapons: list[Weapon] = []
-
-    def contains_player(self) -> bool:
-        px = self._player.position.x
-        py = self._player.position.y
-
-        return (
-            px >= self.position.x
-            and px <= self.position.x + self.width
-            and py >= self.position.y
-            and py <= self.position.y + self.height
-        )
+        # chunks away from every player sleep and aren't updated, see World
+        self.awake = False
+        # the first tick the chunk wasn't updated on, the world's first
+        # tick is 1, see World.update
+        self._slept_at = 1
+        # chunks respawn food on different ticks so it doesn't all
+        # happen on the same one
+        self._respawn_offset = respawn_offset
 
     # returns a point in the chunk
-    def random_pos(self) -> Vector2:
+    def random_pos(self, rng: random.Random) -> Vector2:
         return Vector2(
-            random.randint(int(self.position.x), int(
+            rng.randint(int(self.position.x), int(
                 self.position.x + self.width)),
-            random.randint(int(self.position.y), int(
+            rng.randint(int(self.position.y), int(
                 self.position.y + self.height)),
         )
 
-    def update(self, screen, enemies: list[Enemy], respawn=False):
-        food_to_remove: list[int] = []
-        player_collision_circles = self._player.collision_circles()
-        enemy_collision_circles = [enemy.collision_circle()
-                                   for enemy in enemies]
-        for i, food in enumerate(self.food):
-            food_eaten = False
-            fcc = food.collision_circle()
-            for j, cc in enumerate(player_collision_circles):
-                if cc.is_colliding_with(fcc):
-                    # self._player.size = (self._player.size**2 + food.radius**2) ** 0.5
-                    self._player.blobs[j].eat_food(food)
-                    food_to_remove.append(i)
-                    food_eaten = True
-                    break
-                # check if the player is close enough to start
-                # making the food be attracted to the player
-                else:
-                    fcc.radius = self.FOOD_ATTRACTION_RADIUS
-                    if cc.is_colliding_with(fcc):
-                        dir = (self._player.position -
-                               food.position).normalize()
-                        food.position += dir * self.FOOD_ATTRACTION
-
-            for j, cc in enumerate(enemy_collision_circles):
-                if i in food_to_remove:
-                    continue
-
-                if cc.is_colliding_with(fcc):
-                    enemies[j].eat_food(food)
-                    food_to_remove.append(i)
-                    food_eaten = True
-                    break
-
-            if not food_eaten:
-                food.render(screen, self._player.camera)
-
-        if self._player.weapon is None and self._player.can_pickup_weapon:
-            weapon_picked_up = False
-            for i, weapon in enumerate(self._weapons):
-                for cc in player_collision_circles:
-                    if cc.is_colliding_with(weapon.collision_circle()):
-                        self._player.weapon = self._weapons.pop(i)
-                        weapon_picked_up = True
-                        break
-
-                if weapon_picked_up:
-                    break
-
-        # go in reverse order to avoid skipping over elements
-        for i in sorted(food_to_remove, reverse=True):
-            del self.food[i]
-
-        if respawn and len(self.food) < self.MAX_FOOD_PER_CHUNK:
-            self.food.append(
-                Food(
-                    self.random_pos(),
-                    random.randint(5, 20),
-                    random.choice(colors),
-                )
-            )
-
-    def render_weapons(self, screen, camera: Camera):
+    # time is the world's tick count
+    def update(self, players: list[Player], time: int):
+        self.pickup_weapons(players)
+        self.respawn_food(time)
+
+    def pickup_weapons(self, players: list[Player]):
+        for player in players:
+            if self._weapons and player.weapon is None and player.can_pickup_weapon:
+                self._pickup_weapon(player)
+
+    def respawn_food(self, time: int):
+        if (time + self._respawn_offset) % World.FOOD_RESPAWN_TIME == 0:
+            self.spawn_food(1)
+
+    def _pickup_weapon(self, player: Player):
+        # weapons are few and already bucketed by chunk so a
+        # linear scan here is cheaper than maintaining a hash
+        x, y, size = circles_of(player.blobs)
+        for i, weapon in enumerate(self._weapons):
+            wx, wy = weapon.position
+            if len(circle_vs_many(wx, wy, Weapon.PICKUP_RADIUS, x, y, size)) > 0:
+                player.weapon = self._weapons.pop(i)
+                return
+
+    # a chunk put to sleep on a tick isn't updated on it and one woken on a
+    # tick is, so it missed the ticks from _slept_at up to but not
+    # including the one it wakes on
+    def wake(self, time: int):
+        self.awake = True
+        # catch up on the food that would have respawned while asleep
+        self.spawn_food(self._respawns_between(self._slept_at - 1, time - 1))
+
+    def sleep(self, time: int):
+        self.awake = False
+        self._slept_at = time
+
+    # how many respawns happen after tick `start` up to and including `end`
+    def _respawns_between(self, start: int, end: int) -> int:
+        t = World.FOOD_RESPAWN_TIME
+        offset = self._respawn_offset
+        return (end + offset) // t - (start + offset) // t
+
+    def rect(self) -> pygame.Rect:
+        return pygame.Rect(self.position.x, self.position.y, self.width, self.height)
+
+    def render_weapons(self, screen, camera: Camera) -> int:
         for weapon in self._weapons:
             weapon.render(screen, camera)
+        return len(self._weapons)
 
     def add_weapon(self, weapon: Weapon):
         self._weapons.append(weapon)
 
     def spawn_food(self, n_food: int):
-        if len(self.food) >= self.MAX_FOOD_PER_CHUNK:
-            return
-
-        for _ in range(n_food):
-            self.food.append(
-                Food(
-                    self.random_pos(),
-                    random.randint(5, 20),
-                    random.choice(colors),
-                )
-            )
+        self.food.spawn(n_food, self.rect())
 
 
 class World:
-<<<<<<< HEAD
-    CHUNKS_PER_AXIS = 5
-        # change to 9 after testing
-=======
     CHUNKS_PER_AXIS = 9
     FOOD_RESPAWN_TIME = 60
-
-<<<<<<< HEAD
-    def __init__(self, screen, player: Player, controller=None) -> None:
-=======
->>>>>>> 5eb7fd355416b6c30b89f9f70e736ac2379ad24f
-    def __init__(self, screen, player: Player) -> None:
->>>>>>> 9f5ce80218e32a92a0e130c9e5bbd747eb40a907
+    # zoomed out food is drawn from per chunk layers cached for each step
+    # of zoom, see FoodLayer. closer in there's little enough food on
+    # screen that drawing it piece by piece is quicker
+    FOOD_LAYER_ZOOM_STEP = 0.01
+    MAX_FOOD_LAYER_ZOOM = 0.8
+    # enough for the chunks on screen in two views zoomed right out
+    FOOD_LAYER_CACHE_SIZE = 48
+
+    def __init__(
+        self,
+        players: list[Player],
+        rng: Optional[np.random.Generator] = None,
+        chunks_per_axis: Optional[int] = None,
+        food_threads: int = 0,
+    ) -> None:
+        if chunks_per_axis is not None:
+            self.CHUNKS_PER_AXIS = chunks_per_axis
+        # food in each chunk is resolved on these threads when there are
+        # any, see resolve_food. the result is the same either way
+        self._food_pool = ThreadPoolExecutor(food_threads) if food_threads > 0 else None
         self.chunks: list[Chunk] = []
-        self.player = player
-        self.controller = controller
-        self.hud = Hud(screen)
+        # grid[x][y] is the chunk at cell (x, y)
+        self._grid: list[list[Chunk]] = []
+        self.players = players
         self.time = 0
+        # chunks within the active radius of any player, in a stable order
+        # kept up to date as players move between chunks
+        self.active_chunks: list[Chunk] = []
+        # player -> (cell, radius, chunks) they were last active around
+        self._active: dict[Player, tuple[tuple[int, int], int, list[Chunk]]] = {}
+        self._food_layers: LRUCache[tuple[Chunk, int], FoodLayer] = LRUCache(
+            self.FOOD_LAYER_CACHE_SIZE
+        )
 
-        pos = Vector2(0, 0)
-        for _ in range(self.CHUNKS_PER_AXIS):
-            pos.y = 0
-            for _ in range(self.CHUNKS_PER_AXIS):
-                self.chunks.append(Chunk(pos.copy(), player))
-                self.chunks[-1].spawn_food(Chunk.MAX_FOOD_PER_CHUNK)
-                pos.y += Chunk.CHUNK_SIZE
-
-            pos.x += Chunk.CHUNK_SIZE
+        for x in range(self.CHUNKS_PER_AXIS):
+            column: list[Chunk] = []
+            for y in range(self.CHUNKS_PER_AXIS):
+                chunk = Chunk(
+                    Vector2(x * Chunk.CHUNK_SIZE, y * Chunk.CHUNK_SIZE),
+                    rng,
+                    len(self.chunks) % self.FOOD_RESPAWN_TIME,
+                )
+                chunk.spawn_food(Chunk.MAX_FOOD_PER_CHUNK)
+                column.append(chunk)
+                self.chunks.append(chunk)
+            self._grid.append(column)
 
         for chunk in self.chunks:
             chunk.spawn_food(100)
 
-    # renders the hud as well
-    def update(self, screen, enemies: list[Enemy]):
+    # only chunks at most `radius` cells away from a player are updated
+    # and only the ones the scheduler says are due resolve their food
+    def update(self, enemies: EnemySwarm, radius: int, lod: Optional[LodScheduler] = None):
         self.time += 1
-        respawn = (self.time % self.FOOD_RESPAWN_TIME == 0)
-        for chunk in self.get_render_chunks(screen):
-            chunk.update(screen, enemies, respawn)
-            chunk.render_weapons(screen, self.player.camera)
-        self.hud.render(self.player, self.controller)
-
-    
-    def get_render_chunks(self, screen) -> list[Chunk]:
-        chunks = []
-        for chunk in self.chunks:
-            if chunk.contains_player():
-                chunks.append(chunk)
-                chunks += self.get_surrounding_chunks(screen)
-                break
-
-        return chunks
+        self._track_players(radius)
+
+        # each player's chunks are resolved together, players close enough
+        # to share chunks share one pass
+        resolved: set[Chunk] = set()
+        for player in self.players:
+            chunks = [c for c in self._active[player][2] if c not in resolved]
+            if lod is not None:
+                chunks = [c for c in chunks if lod.chunk_due(self.time, c.rect(), c._respawn_offset)]
+            if chunks:
+                resolved.update(chunks)
+                self._update_food(chunks, enemies)
+
+        for chunk in self.active_chunks:
+            chunk.update(self.players, self.time)
+
+    def _update_food(self, chunks: list[Chunk], enemies: EnemySwarm):
+        area = chunks[0].rect().unionall([chunk.rect() for chunk in chunks[1:]])
+        reach = area.inflate(2 * Chunk.FOOD_ATTRACTION_RADIUS, 2 * Chunk.FOOD_ATTRACTION_RADIUS)
+        blobs = []
+        targets = []
+        for player in self.players:
+            for blob in player.blobs:
+                if circle_in_rect(blob.position, blob.size, reach):
+                    blobs.append(blob)
+                    targets.append(player.position)
+        near = enemies.in_rect(area)
+        # players get first pick of the food, only they attract it
+        eaten = resolve_food(
+            [chunk.food for chunk in chunks],
+            blobs,
+            targets,
+            Chunk.FOOD_ATTRACTION_RADIUS,
+            Chunk.FOOD_ATTRACTION,
+            self._food_pool,
+            (enemies.x[near], enemies.y[near], enemies.size[near]),
+        )
+        enemies.eat_food(near, eaten)
+
+    # updates which chunks are active, only redoing the players that
+    # moved into another chunk since last time
+    def _track_players(self, radius: int):
+        changed = False
+        for player in [p for p in self._active if p not in self.players]:
+            del self._active[player]
+            changed = True
+        for player in self.players:
+            cell = self.cell_of(player.position.x, player.position.y)
+            last = self._active.get(player)
+            if last is None or last[0] != cell or last[1] != radius:
+                chunks = self.chunks_around(player.position, radius, radius)
+                self._active[player] = (cell, radius, chunks)
+                changed = True
+
+        if not changed:
+            return
 
-    def get_surrounding_chunks(self, screen) -> list[Chunk]:
-        chunk_x = int(self.player.position.x // Chunk.CHUNK_SIZE)
-        chunk_y = int(self.player.position.y // Chunk.CHUNK_SIZE)
+        active: dict[Chunk, None] = {}
+        for player in self.players:
+            active.update(dict.fromkeys(self._active[player][2]))
+        for chunk in self.active_chunks:
+            if chunk not in active:
+                chunk.sleep(self.time)
+        for chunk in active:
+            if not chunk.awake:
+                chunk.wake(self.time)
+        self.active_chunks = list(active)
+
+    # converts a world position into a (column, row) grid cell
+    def cell_of(self, x: float, y: float) -> tuple[int, int]:
+        return int(x // Chunk.CHUNK_SIZE), int(y // Chunk.CHUNK_SIZE)
+
+    # returns the chunk containing the world position (x, y)
+    # or None if the position is outside the world
+    def chunk_at(self, x: float, y: float) -> Optional[Chunk]:
+        w, h = self.size()
+        if x < 0 or y < 0 or x > w or y > h:
+            return None
+        cx, cy = self.cell_of(x, y)
+        # positions on the far edge belong to the last chunk
+        cx = min(cx, self.CHUNKS_PER_AXIS - 1)
+        cy = min(cy, self.CHUNKS_PER_AXIS - 1)
+        return self._grid[cx][cy]
+
+    # returns every chunk overlapping the world space rect
+    def chunks_in_rect(self, rect: pygame.Rect) -> list[Chunk]:
+        min_x, min_y = self.cell_of(rect.left, rect.top)
+        max_x, max_y = self.cell_of(rect.right - 1, rect.bottom - 1)
+        min_x = max(min_x, 0)
+        min_y = max(min_y, 0)
+        max_x = min(max_x, self.CHUNKS_PER_AXIS - 1)
+        max_y = min(max_y, self.CHUNKS_PER_AXIS - 1)
 
-        surrounding_chunks = []
+        chunks = []
+        for x in range(min_x, max_x + 1):
+            column = self._grid[x]
+            for y in range(min_y, max_y + 1):
+                chunks.append(column[y])
+        return chunks
 
-        chunks_horiz = int(
-            screen.get_width() // (2 * Chunk.CHUNK_SIZE * self.player.camera.zoom) + 2
-        )
-        chunks_vert = int(
-            screen.get_height() // (2 * Chunk.CHUNK_SIZE * self.player.camera.zoom) + 2
+    # returns the chunks at most `radius_x` columns and `radius_y` rows
+    # away from the chunk containing the position
+    def chunks_around(self, pos: Vector2, radius_x: int, radius_y: int) -> list[Chunk]:
+        cx, cy = self.cell_of(pos.x, pos.y)
+        rect = pygame.Rect(
+            (cx - radius_x) * Chunk.CHUNK_SIZE,
+            (cy - radius_y) * Chunk.CHUNK_SIZE,
+            (2 * radius_x + 1) * Chunk.CHUNK_SIZE,
+            (2 * radius_y + 1) * Chunk.CHUNK_SIZE,
         )
-        for dx in range(-chunks_horiz + 1, chunks_horiz):
-            for dy in range(-chunks_vert + 1, chunks_vert):
-                neighbor_x = chunk_x + dx
-                neighbor_y = chunk_y + dy
-
-                for chunk in self.chunks:
-                    chunk_grid_x = int(chunk.position.x // Chunk.CHUNK_SIZE)
-                    chunk_grid_y = int(chunk.position.y // Chunk.CHUNK_SIZE)
-
-                    if chunk_grid_x == neighbor_x and chunk_grid_y == neighbor_y:
-                        surrounding_chunks.append(chunk)
+        return self.chunks_in_rect(rect)
 
-        return surrounding_chunks
+    # returns the chunks visible from the player's camera
+    def get_render_chunks(self, screen, player: Player) -> list[Chunk]:
+        view = player.camera.view_rect(screen)
+        # attracted food can drift a little past its chunk's edge
+        margin = 2 * (FoodStore.MAX_RADIUS + Chunk.FOOD_ATTRACTION_RADIUS)
+        return self.chunks_in_rect(view.inflate(margin, margin))
 
-    def render_chunk_outlines(self, screen):
+    def render_chunk_outlines(self, screen, camera: Camera):
         for chunk in self.chunks:
-            pos = self.player.camera.to_screen_pos(screen, chunk.position)
+            pos = camera.to_screen_pos(screen, chunk.position)
             rect = pygame.Rect(
                 pos.x,
                 pos.y,
-                chunk.width * self.player.camera.zoom,
-                chunk.height * self.player.camera.zoom,
+                chunk.width * camera.zoom,
+                chunk.height * camera.zoom,
             )
             
             pygame.draw.rect(
                 screen,
-                "green",
+                "green" if chunk.awake else "gray",
                 rect,
-                int(10.0 * self.player.camera.zoom),
-                int(10.0 * self.player.camera.zoom),
+                int(10.0 * camera.zoom),
+                int(10.0 * camera.zoom),
             )
 
     def bounds(self) -> Bounds:
@@ -248,17 +311,36 @@ class World:
         s = self.CHUNKS_PER_AXIS * Chunk.CHUNK_SIZE
         return s, s
 
-    def random_chunk(self) -> Chunk:
-        return random.choice(self.chunks)
-
-    def render_food(self, screen, camera, player=None):
-        original_player = self.player
-        if player:
-            self.player = player
-        
-        chunks = self.get_render_chunks(screen)
-        for chunk in chunks:
-            for food in chunk.food:
-                food.render(screen, camera)
-        
-        self.player = original_player
+    def random_chunk(self, rng: random.Random) -> Chunk:
+        return rng.choice(self.chunks)
+
+    # both return how many things were drawn
+    def render_food(self, screen, player: Player) -> int:
+        camera = player.camera
+        chunks = self.get_render_chunks(screen, player)
+        if camera.zoom > self.MAX_FOOD_LAYER_ZOOM:
+            view = camera.view_rect(screen)
+            return sum(chunk.food.render(screen, camera, view) for chunk in chunks)
+
+        zoom_step = round(camera.zoom / self.FOOD_LAYER_ZOOM_STEP)
+        return sum(self._food_layer(chunk, zoom_step).render(screen, camera) for chunk in chunks)
+
+    def _food_layer(self, chunk: Chunk, zoom_step: int) -> FoodLayer:
+        layer = self._food_layers.get((chunk, zoom_step))
+        if layer is None:
+            # food near the edge of a chunk pokes out of it
+            margin = 2 * (FoodStore.MAX_RADIUS + Chunk.FOOD_ATTRACTION_RADIUS)
+            layer = FoodLayer(
+                chunk.food,
+                chunk.rect().inflate(margin, margin),
+                zoom_step * self.FOOD_LAYER_ZOOM_STEP,
+            )
+            self._food_layers.put((chunk, zoom_step), layer)
+        return layer
+
+    def render_weapons(self, screen, player: Player) -> int:
+        drawn = 0
+        for chunk in self.get_render_chunks(screen, player):
+            drawn += chunk.render_weapons(screen, player.camera)
+        return drawn
+